@@ -0,0 +1,66 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+# Persian and Arabic-Indic digits, Arabic yeh/kaf and the zero-width non-joiner, as they
+# appear in the scraped addresses, mapped to one spelling
+_NORMALIZE = str.maketrans({**{chr(0x06F0 + d): str(d) for d in range(10)},
+                            **{chr(0x0660 + d): str(d) for d in range(10)},
+                            "ي": "ی", "ى": "ی", "ك": "ک", "‌": " "})
+
+# Words that start the street part of an address
+STREET_WORDS = ("خیابان", "بلوار", "بزرگراه", "اتوبان", "میدان", "کوچه", "جاده")
+
+_DISTRICT = re.compile(r"منطقه\s*(\d{1,2})")
+_NEIGHBORHOOD = re.compile(r"محله\s+(.+?)(?=\s+(?:%s)\b|$)" % "|".join(STREET_WORDS))
+_STREET = re.compile(r"(?:^|\s)(?:%s)\s+(.+)$" % "|".join(STREET_WORDS))
+
+ADDRESS_FIELDS = ("district", "neighborhood", "street")
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join((text or "").translate(_NORMALIZE).split())
+
+
+def normalize_neighborhood(name: Optional[str]) -> Optional[str]:
+    """Neighbourhood name as stored: normalised spelling, without a bracketed alias"""
+    name = normalize(re.sub(r"\(.*?\)", " ", name or ""))
+    return name[:100] or None
+
+
+def parse_address(address: Optional[str]) -> Dict[str, object]:
+    """
+    District number, neighbourhood and street of an address written like the maskan-file
+    ones, "منطقه 9 محله هنرستان خیابان هاشمیه ...". A part that is not found is None.
+    """
+    text = normalize(address)
+    district = _DISTRICT.search(text)
+    neighborhood = _NEIGHBORHOOD.search(text)
+    street = _STREET.search(text)
+    return {
+        "district": int(district.group(1)) if district else None,
+        "neighborhood": normalize_neighborhood(neighborhood.group(1)) if neighborhood else None,
+        "street": street.group(1)[:200] if street else None,
+    }
+
+
+class DistrictBlocks:
+    """
+    Blocking of a list of listings for the pairwise similarity jobs by district: two
+    listings whose districts are both known are only compared when they are equal.
+    A listing without a district is compared with everything.
+    """
+
+    def __init__(self, properties: Sequence[dict]):
+        self.districts: List[Optional[int]] = [p.get("district") for p in properties]
+        self.unknown = [i for i, district in enumerate(self.districts) if district is None]
+        self.members: Dict[int, List[int]] = {}
+        for i, district in enumerate(self.districts):
+            if district is not None:
+                self.members.setdefault(district, []).append(i)
+
+    def partners(self, i: int) -> Optional[List[int]]:
+        """Indexes the listing at i is compared with, in order, or None for every listing"""
+        district = self.districts[i]
+        if district is None:
+            return None
+        return sorted(self.members[district] + self.unknown)
@@ -0,0 +1,179 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+from metrics import count
+
+# URL patterns (CDP wildcard syntax) per kind of resource we never need to parse a listing
+RESOURCE_PATTERNS = {
+    "image": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "stylesheet": ["*.css*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*"],
+}
+
+# Analytics, ads and chat widgets seen on the listing sites
+THIRD_PARTY_PATTERNS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*yandex.ru*", "*mc.yandex*", "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+    "*goftino.com*", "*raychat.io*", "*najva.com*", "*trustseal.enamad.ir*",
+]
+
+# Rough transfer sizes used to estimate what a blocked request would have cost
+TYPICAL_BYTES = {"image": 60_000, "font": 40_000, "stylesheet": 25_000, "media": 500_000, "third_party": 30_000}
+
+
+@dataclass
+class BlockingProfile:
+    """
+    What to keep out of the browser for one site.
+
+    allowlist holds hosts or extensions that must keep loading on this site even though
+    they are blocked by default (e.g. ".svg" for inline icons, or a chat host a page needs).
+    """
+    name: str
+    blocked_types: Tuple[str, ...] = ("image", "font", "stylesheet", "media")
+    block_third_party: bool = True
+    allowlist: List[str] = field(default_factory=list)
+
+    def blocked_patterns(self) -> List[str]:
+        patterns = [p for kind in self.blocked_types for p in RESOURCE_PATTERNS[kind]]
+        if self.block_third_party:
+            patterns += THIRD_PARTY_PATTERNS
+        # setBlockedURLs has no exceptions, so an allowlisted entry drops every pattern naming it
+        return [p for p in patterns if not any(allowed in p for allowed in self.allowlist)]
+
+    def classify(self, url: str) -> str:
+        lowered = url.lower()
+        for pattern in THIRD_PARTY_PATTERNS:
+            if pattern.strip("*") in lowered:
+                return "third_party"
+        for kind, patterns in RESOURCE_PATTERNS.items():
+            if any(p.strip("*") in lowered for p in patterns):
+                return kind
+        return "other"
+
+
+PROFILES: Dict[str, BlockingProfile] = {
+    # Listing detail pages: only the DOM and the img[src] attributes are read
+    "maskan-file-detail": BlockingProfile("maskan-file-detail"),
+    # Default.aspx discovery: the "load more" link must stay clickable, so styles are kept
+    "maskan-file-listing": BlockingProfile("maskan-file-listing", blocked_types=("image", "font", "media")),
+    "none": BlockingProfile("none", blocked_types=(), block_third_party=False),
+}
+
+
+@dataclass
+class PageReport:
+    url: str
+    load_ms: float
+    bytes_downloaded: int
+    blocked_requests: Dict[str, int]
+    estimated_bytes_saved: int
+    # HTTP status of the page itself (None without a performance log) and where it ended up
+    status: Optional[int] = None
+    final_url: Optional[str] = None
+
+    @property
+    def redirected(self) -> bool:
+        return bool(self.final_url) and self.final_url.split("#", 1)[0] != self.url.split("#", 1)[0]
+
+
+def make_chrome(profile: Optional[str] = "maskan-file-detail", headless: bool = True) -> webdriver.Chrome:
+    """
+    Start Chrome with the given blocking profile applied. Images are also turned off
+    through content settings so they are skipped even before the network layer.
+    """
+    blocking = PROFILES[profile or "none"]
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--no-sandbox')
+    if "image" in blocking.blocked_types:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    # Performance log gives us per-request sizes and the requests Chrome refused
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    driver = webdriver.Chrome(service=Service(), options=options)
+    driver.blocking_profile = blocking
+    patterns = blocking.blocked_patterns()
+    if patterns:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    return driver
+
+
+def page_report(driver, url: str) -> PageReport:
+    """
+    Summarise the last page load: transfer size, load time and blocked requests,
+    with an estimate of the bytes the blocked requests would have cost.
+    Reading the performance log also clears it for the next page.
+    """
+    blocking = getattr(driver, "blocking_profile", PROFILES["none"])
+    requested, downloaded, blocked, status = {}, 0, {}, None
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logging.debug(f"Performance log unavailable: {e}")
+        entries = []
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        params = message.get("params", {})
+        if message["method"] == "Network.requestWillBeSent":
+            requested[params["requestId"]] = params["request"]["url"]
+        elif message["method"] == "Network.responseReceived" and params.get("type") == "Document" and status is None:
+            # The first document response is the page itself (redirects only show up in requestWillBeSent)
+            status = params.get("response", {}).get("status")
+        elif message["method"] == "Network.loadingFinished":
+            downloaded += int(params.get("encodedDataLength", 0))
+        elif message["method"] == "Network.loadingFailed" and params.get("blockedReason"):
+            kind = blocking.classify(requested.get(params["requestId"], ""))
+            blocked[kind] = blocked.get(kind, 0) + 1
+
+    try:
+        load_ms = driver.execute_script(
+            "var t = performance.timing; return t.loadEventEnd > 0 ? t.loadEventEnd - t.navigationStart : 0;")
+    except Exception:
+        load_ms = 0
+    saved = sum(TYPICAL_BYTES.get(kind, 0) * n for kind, n in blocked.items())
+    try:
+        final_url = driver.current_url
+    except Exception:
+        final_url = None
+
+    count("browser_bytes_downloaded", downloaded)
+    count("browser_requests_blocked", sum(blocked.values()))
+    count("browser_bytes_saved_estimate", saved)
+    return PageReport(url, float(load_ms or 0), downloaded, blocked, saved,
+                      int(status) if status is not None else None, final_url)
+
+
+def measure_savings(url: str, profile: str = "maskan-file-detail") -> Dict[str, float]:
+    """
+    Load a page once without and once with the profile and report the measured
+    difference in transferred bytes and load time (useful to check a profile).
+    """
+    results = {}
+    for name in ("none", profile):
+        driver = make_chrome(name)
+        try:
+            driver.get(url)
+            results[name] = page_report(driver, url)
+        finally:
+            driver.quit()
+    baseline, blocked = results["none"], results[profile]
+    return {
+        "bytes_saved": baseline.bytes_downloaded - blocked.bytes_downloaded,
+        "ms_saved": baseline.load_ms - blocked.load_ms,
+        "bytes_with_profile": blocked.bytes_downloaded,
+        "bytes_without_profile": baseline.bytes_downloaded,
+    }
+
+
+if __name__ == "__main__":
+    print(measure_savings(input("Enter property URL: ")))
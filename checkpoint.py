@@ -0,0 +1,83 @@
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional
+
+from database_manager import (clear_crawl, load_crawl_items, load_crawl_state, mark_crawl_items,
+                              save_crawl_items, save_crawl_state)
+from metrics import count
+
+
+class Checkpoint:
+    """
+    Durable progress of one long crawl ("job"), kept in the database next to the listings.
+
+    It holds the discovered URL frontier with a status per item (pending, done,
+    dropped) plus a small state dict for things like fetch offsets. After a crash
+    or Ctrl-C the job resumes from the pending items and the saved offsets instead
+    of rediscovering and refetching what was already stored. A job that completed
+    is started afresh on its next run.
+    """
+
+    def __init__(self, job: str, key: Callable[[str], Optional[str]] = lambda url: url, max_attempts: int = 3):
+        """
+        :param key: maps a frontier URL to the key its item is marked by, e.g. its file code
+        :param max_attempts: failed fetches after which an item is dropped instead of kept pending
+        """
+        self.job = job
+        self.key = key
+        self.max_attempts = max_attempts
+        self.state = load_crawl_state(job) or {}
+        self._lock = threading.Lock()
+
+    def frontier(self, discover: Callable[[], Iterable[str]]) -> List[str]:
+        """
+        URLs still to be fetched: the pending part of a saved frontier, or, when there
+        is none, the result of discover() saved as a new frontier first.
+        """
+        if self.state.get("discovered"):
+            pending = load_crawl_items(self.job)
+            if pending:
+                logging.info(f"Resuming {self.job}: {len(pending)} items left of the saved frontier")
+                count("checkpoint_resumed", len(pending))
+                return pending
+        self.reset()
+        urls = list(dict.fromkeys(discover()))
+        save_crawl_items(self.job, [(self.key(url) or url, url) for url in urls])
+        self.update(discovered=True, items=len(urls))
+        return urls
+
+    def done(self, keys: Iterable[str]) -> None:
+        mark_crawl_items(self.job, keys, "done")
+
+    def dropped(self, keys: Iterable[str]) -> None:
+        # Items the cleaner rejected; refetching them on resume would reject them again
+        mark_crawl_items(self.job, keys, "dropped")
+
+    def failed(self, keys: Iterable[str]) -> None:
+        # Items whose fetch failed (deleted listing, 404, ...) stay pending for a few resumes,
+        # then are dropped so a frontier of unfetchable leftovers does not block rediscovery
+        with self._lock:
+            failures = dict(self.state.get("failures", {}))
+            given_up = []
+            for key in keys:
+                if not key:
+                    continue
+                failures[key] = failures.get(key, 0) + 1
+                if failures[key] >= self.max_attempts:
+                    given_up.append(key)
+            self.update(failures=failures)
+        if given_up:
+            logging.warning(f"Dropping {len(given_up)} items of {self.job} after {self.max_attempts} failed fetches")
+            count("checkpoint_given_up", len(given_up))
+            self.dropped(given_up)
+
+    def get(self, name: str, default=None):
+        return self.state.get(name, default)
+
+    def update(self, **values) -> None:
+        self.state.update(values)
+        save_crawl_state(self.job, self.state)
+
+    def reset(self) -> None:
+        clear_crawl(self.job)
+        self.state = {}
@@ -0,0 +1,141 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import count, timed
+
+
+class UnionFind:
+    """Disjoint sets over hashable items with union by size and path halving"""
+
+    def __init__(self):
+        self.parent: Dict[object, object] = {}
+        self.size: Dict[object, int] = {}
+
+    def __contains__(self, item):
+        return item in self.parent
+
+    def find(self, item):
+        parent = self.parent
+        if item not in parent:
+            parent[item] = item
+            self.size[item] = 1
+            return item
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        """Merge the sets of a and b and return the root of the result"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a
+
+
+class DuplicateClusters:
+    """
+    Groups listings into duplicate clusters as matching pairs come in, instead of
+    keeping every pair: k reposts of one flat are one cluster of k members rather
+    than k(k-1)/2 similarity rows.
+
+    A cluster's id is its oldest (lowest) listing id, which stays stable as clusters
+    merge, and its representative is its newest listing, the repost most likely to
+    still be online. Listings without a duplicate are not tracked at all.
+
+    Clusters only ever merge: a listing that changed so it no longer matches stays
+    in its cluster until the next full run rebuilds them.
+    """
+
+    def __init__(self, assignments: Optional[Dict[int, int]] = None):
+        """
+        :param assignments: listing id -> cluster id of previously saved clusters, as
+            returned by load_cluster_assignments
+        """
+        self.sets = UnionFind()
+        self._saved = dict(assignments or {})
+        for listing_id, cluster_id in self._saved.items():
+            self.sets.union(cluster_id, listing_id)
+
+    def add_pair(self, id_1: int, id_2: int) -> None:
+        self.sets.union(id_1, id_2)
+
+    def add_pairs(self, pairs: Iterable[dict]) -> int:
+        """Merge the clusters of every pair shaped like compare_properties results"""
+        added = 0
+        for pair in pairs:
+            self.sets.union(pair["property_1"], pair["property_2"])
+            added += 1
+        return added
+
+    def members(self) -> Dict[object, List[int]]:
+        """root -> sorted member ids of every cluster"""
+        groups: Dict[object, List[int]] = {}
+        for listing_id in self.sets.parent:
+            groups.setdefault(self.sets.find(listing_id), []).append(listing_id)
+        for ids in groups.values():
+            ids.sort()
+        return groups
+
+    def snapshot(self) -> Tuple[Dict[int, int], List[dict]]:
+        """(listing id -> cluster id, cluster rows) of every cluster"""
+        assignments, clusters = {}, []
+        for ids in self.members().values():
+            cluster_id = ids[0]
+            clusters.append({"id": cluster_id, "representative_id": ids[-1], "size": len(ids)})
+            for listing_id in ids:
+                assignments[listing_id] = cluster_id
+        return assignments, clusters
+
+    def changes(self) -> Tuple[Dict[int, int], List[dict], set]:
+        """
+        What changed since the saved assignments: (listings whose cluster id changed or
+        that are new, rows of the clusters that gained members, ids of clusters merged away)
+        """
+        assignments, clusters = self.snapshot()
+        moved = {i: c for i, c in assignments.items() if self._saved.get(i) != c}
+        touched = set(moved.values())
+        removed = {self._saved[i] for i in moved if i in self._saved} - set(assignments.values())
+        return moved, [c for c in clusters if c["id"] in touched], removed
+
+
+def merge_pairs(session, pairs: List[dict]) -> int:
+    """
+    Merge matching pairs into the stored clusters inside an open session, only reading
+    the clusters the pairs touch. Returns the number of listings whose cluster changed.
+    """
+    from database_manager import cluster_members, write_clusters
+
+    ids = {pair["property_1"] for pair in pairs} | {pair["property_2"] for pair in pairs}
+    clusters = DuplicateClusters(cluster_members(session, ids))
+    clusters.add_pairs(pairs)
+    assignments, rows, removed = clusters.changes()
+    if assignments:
+        write_clusters(session, assignments, rows, removed)
+    return len(assignments)
+
+
+def update_clusters(pairs: Iterable[dict], rebuild: bool = False) -> DuplicateClusters:
+    """
+    Merge matching pairs into the stored duplicate clusters and save what changed.
+    With rebuild set, the stored clusters are replaced by the clusters of pairs alone.
+    """
+    from database_manager import load_cluster_assignments, save_clusters
+
+    with timed("clusters"):
+        clusters = DuplicateClusters(None if rebuild else load_cluster_assignments())
+        added = clusters.add_pairs(pairs)
+        if rebuild:
+            assignments, rows = clusters.snapshot()
+            save_clusters(assignments, rows, rebuild=True)
+        else:
+            assignments, rows, removed = clusters.changes()
+            if assignments:
+                save_clusters(assignments, rows, removed)
+    count("cluster_pairs", added)
+    logging.info(f"{added} matching pairs merged; {len(rows)} clusters written")
+    return clusters
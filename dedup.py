@@ -0,0 +1,89 @@
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from clusters import merge_pairs
+from listing import Listing
+from metrics import count, timed
+from similarity_index import SimilarityIndex, shared_index
+
+
+class IngestDeduplicator:
+    """
+    Duplicate detection at ingest, used as a BatchWriter on_stored hook: every listing
+    written is matched against the in-memory SimilarityIndex, added to it, and its
+    matches are merged into the duplicate clusters in the same transaction as the
+    insert. Listings of every source share the process-wide index, so a maskan-file
+    repost of a melkemun listing is clustered as soon as it is stored.
+
+    Only the top k matches are looked up; the index prunes most candidates with
+    vectorised bounds, so the cost per listing stays a few milliseconds as it grows.
+
+    The index only keeps what was committed: if the clustering fails or the insert's
+    transaction rolls back, the listings added to it are taken out again (or their
+    previous versions put back). They are clustered by the next full similarity run.
+    """
+
+    def __init__(self, index: Optional[SimilarityIndex] = None, k: int = 5, min_score: float = 70,
+                 enabled: bool = True):
+        self._index = index
+        self.k = k
+        self.min_score = min_score
+        self.enabled = enabled
+
+    @property
+    def index(self) -> SimilarityIndex:
+        if self._index is None:
+            self._index = shared_index()
+        return self._index
+
+    def warm(self) -> None:
+        # Build the index up front rather than inside the first write transaction
+        if self.enabled:
+            self.index
+
+    def matches(self, listing: Listing) -> List[dict]:
+        """Pairs, shaped like compare_properties results, of a stored listing and its matches"""
+        found = self.index.find_similar(listing, k=self.k, min_score=self.min_score)
+        return [{"property_1": min(listing.id, match["id"]), "property_2": max(listing.id, match["id"]),
+                 "similarity": match["similarity"]} for match in found]
+
+    def _undo(self, added: List[Tuple[int, Optional[Listing]]]) -> None:
+        for listing_id, previous in reversed(added):
+            if previous is None:
+                self.index.remove(listing_id)
+            else:
+                self.index.add(previous)
+        if added:
+            logging.warning(f"{len(added)} listings taken out of the similarity index, their write did not commit")
+
+    def __call__(self, session, listings: List[Listing]) -> None:
+        if not self.enabled:
+            return
+        pairs, duplicates = [], 0
+        added = []  # (id, indexed version it replaced) of every listing added, to undo on rollback
+        try:
+            with timed("dedup"):
+                # One by one, so duplicates within a batch find each other too
+                for listing in listings:
+                    found = self.matches(listing)
+                    added.append((listing.id, self.index.get(listing.id)))
+                    self.index.add(listing)
+                    duplicates += bool(found)
+                    pairs.extend(found)
+                reassigned = merge_pairs(session, pairs) if pairs else 0
+        except Exception:
+            self._undo(added)
+            raise
+        # The insert's transaction can still fail after this hook returned
+        def rolled_back(_, transaction):
+            if not transaction.nested:
+                self._undo(added)
+
+        event.listen(session, "after_soft_rollback", rolled_back)
+        count("dedup_checked", len(listings))
+        count("dedup_duplicate", duplicates)
+        if pairs:
+            logging.info(f"{len(pairs)} duplicate matches among {len(listings)} stored listings, "
+                         f"{reassigned} listings clustered")
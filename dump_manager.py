@@ -0,0 +1,408 @@
+import argparse
+import json
+import logging
+import mmap
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Boolean, Float, Integer, JSON, String
+from sqlalchemy.exc import SQLAlchemyError
+
+from database_manager import Data, Similarity, bulk_create_data, bulk_create_sim, iter_table_rows
+
+# Tables we know how to restore, keyed by their name in the dump
+MODELS = {
+    Data.__tablename__: Data,
+    Similarity.__tablename__: Similarity,
+}
+
+# Statements we care about always start at the beginning of a line
+_STATEMENT_RE = re.compile(rb"^(CREATE TABLE|INSERT INTO) `([^`]+)`", re.M)
+_CREATE_BODY_RE = re.compile(rb"\s*\((.*?)\n\)[^;]*;", re.S)
+_COLUMN_DEF_RE = re.compile(r"^\s*`([^`]+)`\s+([a-z]+)(?:\((\d+)\))?", re.M | re.I)
+_INSERT_COLUMNS_RE = re.compile(rb"\s*(?:\(([^)]*)\)\s*)?VALUES\s*")
+
+# One SQL literal inside a VALUES tuple: quoted string, NULL, number or hex blob
+_VALUE_RE = re.compile(
+    rb"\s*(?:'([^'\\]*(?:(?:\\.|'')[^'\\]*)*)'|(NULL)|([-+]?[0-9][0-9.eE+-]*)|0x([0-9A-Fa-f]*))\s*",
+    re.S,
+)
+_ESCAPE_RE = re.compile(r"\\(.)|''", re.S)
+_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+# mysqldump keeps each extended INSERT under net_buffer_length (1MB by default)
+DEFAULT_STATEMENT_BYTES = 1024 * 1024
+
+
+class DumpParseError(Exception):
+    """Raised when the dump does not look like mysqldump output."""
+
+
+def _unescape(text: str) -> str:
+    """Undo the backslash escaping mysqldump applies inside string literals"""
+    if "\\" not in text and "''" not in text:
+        return text
+    return _ESCAPE_RE.sub(lambda m: "'" if m.group(1) is None else _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def _escape(text: str) -> str:
+    """Escape a string literal the same way mysqldump does"""
+    return (text.replace("\\", "\\\\").replace("\0", "\\0").replace("\n", "\\n")
+            .replace("\r", "\\r").replace("\x1a", "\\Z").replace("'", "\\'").replace('"', '\\"'))
+
+
+class MysqlDumpReader:
+    """
+    Streams rows out of a mysqldump file without loading it into memory.
+
+    The file is memory-mapped and the extended INSERT statements are tokenized
+    in place, so only one row tuple is materialized at a time no matter how long
+    the single-line INSERTs get.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # table name -> list of (column name, type name, length)
+        self.schemas: Dict[str, List[Tuple[str, str, Optional[int]]]] = {}
+
+    def iter_rows(self) -> Iterator[Tuple[str, List[str], tuple]]:
+        """
+        Yield (table, column names, values) for every row in every INSERT statement.
+        CREATE TABLE statements met on the way are recorded in self.schemas.
+        """
+        with open(self.path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file, nothing to stream
+                return
+            try:
+                yield from self._scan(mm)
+            finally:
+                mm.close()
+
+    def _scan(self, mm) -> Iterator[Tuple[str, List[str], tuple]]:
+        pos = 0
+        while True:
+            match = _STATEMENT_RE.search(mm, pos)
+            if not match:
+                return
+            kind, table = match.group(1), match.group(2).decode("utf-8")
+            pos = match.end()
+            if kind == b"CREATE TABLE":
+                pos = self._parse_create(mm, pos, table)
+                continue
+
+            header = _INSERT_COLUMNS_RE.match(mm, pos)
+            if not header:
+                raise DumpParseError(f"Malformed INSERT for table {table} at byte {pos}")
+            pos = header.end()
+            if header.group(1):
+                columns = [c.strip().strip("`") for c in header.group(1).decode("utf-8").split(",")]
+            else:
+                columns = [name for name, _, _ in self.schemas.get(table, [])]
+            if not columns:
+                raise DumpParseError(f"INSERT into {table} before its CREATE TABLE and without a column list")
+
+            while True:
+                values, pos = self._parse_tuple(mm, pos)
+                yield table, columns, values
+                separator = mm[pos:pos + 1]
+                pos += 1
+                if separator == b",":
+                    continue
+                if separator == b";":
+                    break
+                raise DumpParseError(f"Unexpected {separator!r} after a row of {table} at byte {pos - 1}")
+
+    def _parse_create(self, mm, pos: int, table: str) -> int:
+        body = _CREATE_BODY_RE.match(mm, pos)
+        if not body:
+            raise DumpParseError(f"Malformed CREATE TABLE for {table}")
+        definition = body.group(1).decode("utf-8")
+        self.schemas[table] = [
+            (name, type_name, int(length) if length else None)
+            for name, type_name, length in _COLUMN_DEF_RE.findall(definition)
+        ]
+        return body.end()
+
+    def _parse_tuple(self, mm, pos: int) -> Tuple[tuple, int]:
+        while mm[pos:pos + 1].isspace():
+            pos += 1
+        if mm[pos:pos + 1] != b"(":
+            raise DumpParseError(f"Expected '(' at byte {pos}")
+        pos += 1
+        values = []
+        while True:
+            match = _VALUE_RE.match(mm, pos)
+            if not match:
+                raise DumpParseError(f"Unparsable value at byte {pos}")
+            string, null, number, blob = match.groups()
+            if string is not None:
+                values.append(_unescape(string.decode("utf-8")))
+            elif null is not None:
+                values.append(None)
+            elif number is not None:
+                text = number.decode("ascii")
+                values.append(int(text) if text.lstrip("+-").isdigit() else float(text))
+            else:
+                values.append(bytes.fromhex(blob.decode("ascii")))
+            pos = match.end()
+            separator = mm[pos:pos + 1]
+            pos += 1
+            if separator == b",":
+                continue
+            if separator == b")":
+                return tuple(values), pos
+            raise DumpParseError(f"Unexpected {separator!r} inside a row at byte {pos - 1}")
+
+
+class SchemaReconciler:
+    """
+    Maps rows from the dump's (possibly older) table layout onto the current models.
+
+    Columns are matched by name, columns missing from the dump get a default,
+    columns the model no longer has are dropped, and values are coerced to the
+    model's column types. Strings longer than the model allows are truncated.
+    """
+
+    def __init__(self, model, dump_schema: List[Tuple[str, str, Optional[int]]]):
+        self.model = model
+        self.columns = {column.name: column for column in model.__table__.columns}
+        self.dump_schema = {name: (type_name, length) for name, type_name, length in dump_schema}
+        self.truncated = 0
+        self._notes = None
+
+    def notes(self) -> List[str]:
+        """Human readable list of the differences between the dump and the model"""
+        if self._notes is None:
+            notes = []
+            for name, (type_name, length) in self.dump_schema.items():
+                column = self.columns.get(name)
+                if column is None:
+                    notes.append(f"{name}: only in dump, dropped")
+                    continue
+                model_length = getattr(column.type, "length", None)
+                if length and model_length and length != model_length:
+                    change = "widened" if model_length > length else "narrowed, values may be truncated"
+                    notes.append(f"{name}: {type_name}({length}) in dump, {column.type} in model ({change})")
+            for name in self.columns:
+                if self.dump_schema and name not in self.dump_schema:
+                    notes.append(f"{name}: missing from dump, filled with default")
+            self._notes = notes
+        return self._notes
+
+    def to_model_row(self, columns: List[str], values: tuple) -> Dict[str, Any]:
+        row = {}
+        for name, value in zip(columns, values):
+            column = self.columns.get(name)
+            if column is not None:
+                row[name] = self._coerce(column, value)
+        for name, column in self.columns.items():
+            if name not in row:
+                row[name] = None if column.nullable or column.primary_key else self._coerce(column, "")
+        return row
+
+    def _coerce(self, column, value):
+        if value is None:
+            return None
+        column_type = column.type
+        if isinstance(column_type, JSON):
+            return json.loads(value) if isinstance(value, (str, bytes)) else value
+        if isinstance(column_type, Boolean):
+            return bool(int(value))
+        if isinstance(column_type, Integer):
+            return int(value)
+        if isinstance(column_type, Float):
+            return float(value)
+        if isinstance(column_type, String):
+            value = value.decode("utf-8") if isinstance(value, bytes) else str(value)
+            if column_type.length and len(value) > column_type.length:
+                self.truncated += 1
+                value = value[:column_type.length]
+        return value
+
+
+def _to_sim_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": row["id"], "property_1": row["id_1"], "property_2": row["id_2"], "similarity": row["similarity"]}
+
+
+_LOADERS = {
+    Data.__tablename__: (bulk_create_data, None),
+    Similarity.__tablename__: (bulk_create_sim, _to_sim_dict),
+}
+
+
+def import_dump(path: str, batch_size: int = 500) -> Dict[str, Dict[str, int]]:
+    """
+    Stream a mysqldump file into the configured database.
+
+    Rows are reconciled against the current models and bulk-loaded in batches
+    of batch_size, so memory use does not depend on the size of the dump.
+
+    A batch the database rejects is logged and counted as failed; the import goes on
+    with the next one.
+
+    :return: per-table counters (rows read, rows inserted, rows failed, values truncated)
+    """
+    reader = MysqlDumpReader(path)
+    reconcilers: Dict[str, SchemaReconciler] = {}
+    batches: Dict[str, List[Dict[str, Any]]] = {}
+    stats: Dict[str, Dict[str, int]] = {}
+
+    def flush(table):
+        loader, convert = _LOADERS[table]
+        rows = batches[table] if convert is None else [convert(row) for row in batches[table]]
+        batches[table] = []
+        try:
+            stats[table]["inserted"] += loader(rows)
+        except SQLAlchemyError as e:
+            stats[table]["failed"] += len(rows)
+            logging.error(f"Failed to load {len(rows)} rows of {table}: {e}")
+
+    for table, columns, values in reader.iter_rows():
+        if table not in MODELS:
+            stats.setdefault(table, {"rows": 0, "inserted": 0, "failed": 0, "truncated": 0})["rows"] += 1
+            continue
+        reconciler = reconcilers.get(table)
+        if reconciler is None:
+            reconciler = reconcilers[table] = SchemaReconciler(MODELS[table], reader.schemas.get(table, []))
+            for note in reconciler.notes():
+                logging.info(f"{table}.{note}")
+            stats[table] = {"rows": 0, "inserted": 0, "failed": 0, "truncated": 0}
+            batches[table] = []
+
+        batches[table].append(reconciler.to_model_row(columns, values))
+        stats[table]["rows"] += 1
+        if len(batches[table]) >= batch_size:
+            flush(table)
+
+    for table in batches:
+        if batches[table]:
+            flush(table)
+    for table, reconciler in reconcilers.items():
+        stats[table]["truncated"] = reconciler.truncated
+    for table in stats:
+        if table not in MODELS:
+            logging.warning(f"Skipped {stats[table]['rows']} rows of unknown table {table}")
+        elif stats[table]["failed"]:
+            logging.warning(f"{stats[table]['failed']} of {stats[table]['rows']} rows of {table} failed to load")
+    return stats
+
+
+def _literal(value) -> str:
+    """Render a Python value as a MySQL literal"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        text = repr(value)
+        return text[:-2] if text.endswith(".0") else text
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    return f"'{_escape(str(value))}'"
+
+
+def _column_ddl(column) -> str:
+    """Render one column definition in mysqldump's layout"""
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        type_name = "tinyint(1)"
+    elif isinstance(column_type, Integer):
+        type_name = "int"
+    elif isinstance(column_type, Float):
+        type_name = "float"
+    elif isinstance(column_type, JSON):
+        type_name = "json"
+    else:
+        type_name = f"varchar({column_type.length})"
+    if column.primary_key:
+        return f"  `{column.name}` {type_name} NOT NULL AUTO_INCREMENT"
+    return f"  `{column.name}` {type_name} " + ("DEFAULT NULL" if column.nullable else "NOT NULL")
+
+
+def _write_table(out, model, batch_size: int, statement_bytes: int) -> int:
+    table = model.__table__
+    definitions = [_column_ddl(column) for column in table.columns]
+    definitions.append("  PRIMARY KEY (" + ",".join(f"`{c.name}`" for c in table.primary_key.columns) + ")")
+    out.write(f"--\n-- Table structure for table `{table.name}`\n--\n\n")
+    out.write(f"DROP TABLE IF EXISTS `{table.name}`;\n")
+    out.write(f"CREATE TABLE `{table.name}` (\n" + ",\n".join(definitions) + "\n")
+    out.write(") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;\n\n")
+    out.write(f"--\n-- Dumping data for table `{table.name}`\n--\n\n")
+    out.write(f"LOCK TABLES `{table.name}` WRITE;\n")
+    out.write(f"/*!40000 ALTER TABLE `{table.name}` DISABLE KEYS */;\n")
+
+    names = [column.name for column in table.columns]
+    prefix = f"INSERT INTO `{table.name}` VALUES "
+    pending, pending_bytes, count = [], 0, 0
+    for row in iter_table_rows(model, batch_size=batch_size):
+        values = "(" + ",".join(_literal(row[name]) for name in names) + ")"
+        size = len(values.encode("utf-8")) + 1
+        if pending and pending_bytes + size > statement_bytes:
+            out.write(prefix + ",".join(pending) + ";\n")
+            pending, pending_bytes = [], 0
+        pending.append(values)
+        pending_bytes += size
+        count += 1
+    if pending:
+        out.write(prefix + ",".join(pending) + ";\n")
+
+    out.write(f"/*!40000 ALTER TABLE `{table.name}` ENABLE KEYS */;\n")
+    out.write("UNLOCK TABLES;\n\n")
+
+    # Secondary indexes are built once the rows are in, which is faster than maintaining them row by row
+    indexes = sorted(table.indexes, key=lambda index: index.name)
+    if indexes:
+        out.write(f"--\n-- Indexes for table `{table.name}`\n--\n\n")
+        for index in indexes:
+            unique = "UNIQUE " if index.unique else ""
+            columns = ",".join(f"`{column.name}`" for column in index.columns)
+            out.write(f"CREATE {unique}INDEX `{index.name}` ON `{table.name}` ({columns});\n")
+        out.write("\n")
+    return count
+
+
+def export_dump(path: str, batch_size: int = 1000, statement_bytes: int = DEFAULT_STATEMENT_BYTES) -> Dict[str, int]:
+    """
+    Write the current tables to a mysqldump-compatible file.
+
+    Rows are streamed from the database in batches and grouped into extended
+    INSERT statements of at most statement_bytes, like mysqldump does.
+
+    :return: number of rows written per table
+    """
+    counts = {}
+    with open(path, "w", encoding="utf-8", newline="\n") as out:
+        out.write("-- CodeScraper dump\n--\n-- Database: codescraper\n")
+        out.write("-- ------------------------------------------------------\n\n")
+        out.write("/*!50503 SET NAMES utf8mb4 */;\n")
+        out.write("/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n")
+        out.write("/*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;\n\n")
+        for name, model in MODELS.items():
+            counts[name] = _write_table(out, model, batch_size, statement_bytes)
+        out.write("/*!40101 SET SQL_MODE=@OLD_SQL_MODE */;\n")
+        out.write("/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n\n")
+        out.write(f"-- Dump completed on {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import or export mysqldump snapshots of the codescraper tables")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="load a dump into the configured database")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--batch-size", type=int, default=500)
+    export_parser = subparsers.add_parser("export", help="write the current tables to a dump")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        print(import_dump(args.path, batch_size=args.batch_size))
+    else:
+        print(export_dump(args.path, batch_size=args.batch_size))
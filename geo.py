@@ -0,0 +1,125 @@
+import math
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision of the geohash stored with every listing (cells of about 4.8m x 4.8m);
+# radius queries use a prefix of it
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Point = Tuple[float, float]
+
+
+def geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = (value << 1) | 1
+            interval[0] = middle
+        else:
+            value <<= 1
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value, bits = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell of this precision"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def coordinates(listing: dict) -> Optional[Point]:
+    """(latitude, longitude) of a listing, or None when it has no usable coordinates"""
+    lat, lon = listing.get("latitude"), listing.get("longitude")
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    # 0, 0 is what an unset map pin comes back as
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+
+def precision_for(radius_km: float, lat: float) -> int:
+    """
+    Longest geohash prefix whose cells are at least radius_km high and wide at this
+    latitude, so the 3 x 3 cells around a point cover every point within radius_km.
+    """
+    shrink = max(math.cos(math.radians(min(abs(lat), 89.0))), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * KM_PER_DEGREE * shrink >= radius_km:
+            return precision
+    return 0
+
+
+def covering_cells(lat: float, lon: float, radius_km: float, precision: Optional[int] = None) -> Set[str]:
+    """Geohash prefixes whose cells together contain every point within radius_km of lat, lon"""
+    precision = precision_for(radius_km, lat) if precision is None else precision
+    if precision == 0:
+        return {""}
+    height, width = cell_size(precision)
+    cells = set()
+    for step_lat in (-1, 0, 1):
+        for step_lon in (-1, 0, 1):
+            cell_lat = min(max(lat + step_lat * height, -90.0), 90.0)
+            cell_lon = (lon + step_lon * width + 180.0) % 360.0 - 180.0
+            cells.add(geohash(cell_lat, cell_lon, precision))
+    return cells
+
+
+class GeoBlocks:
+    """
+    Blocking of a list of listings by location for the pairwise similarity jobs:
+    listings with coordinates are only paired with listings within radius_km,
+    found through a geohash grid, and with every listing without coordinates.
+    Listings without coordinates keep being paired with everything, so their
+    matches still come from the text and number terms alone.
+    """
+
+    def __init__(self, properties: Sequence[dict], radius_km: float):
+        self.radius_km = radius_km
+        self.points: List[Optional[Point]] = [coordinates(p) for p in properties]
+        self.unplaced = [i for i, point in enumerate(self.points) if point is None]
+        placed = [point for point in self.points if point is not None]
+        # One precision for the whole grid, fitted to the latitude where cells are narrowest
+        self.precision = precision_for(radius_km, max((abs(lat) for lat, _ in placed), default=0.0))
+        self.cells: Dict[str, List[int]] = {}
+        for i, point in enumerate(self.points):
+            if point is not None:
+                self.cells.setdefault(geohash(*point, self.precision), []).append(i)
+
+    def near(self, lat: float, lon: float) -> List[int]:
+        """Indexes of the placed listings within radius_km of lat, lon, in order"""
+        found = []
+        for cell in covering_cells(lat, lon, self.radius_km, self.precision):
+            for i in self.cells.get(cell, ()):
+                if haversine_km(lat, lon, *self.points[i]) <= self.radius_km:
+                    found.append(i)
+        return sorted(found)
+
+    def partners(self, i: int) -> Optional[List[int]]:
+        """Indexes the listing at i is compared with, in order, or None for every listing"""
+        if self.points[i] is None:
+            return None
+        return sorted(self.near(*self.points[i]) + self.unplaced)
@@ -0,0 +1,123 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import REGISTRY
+from rate_governor import GOVERNOR, RateGovernor
+
+REQUEST_SECONDS = REGISTRY.histogram("codescraper_http_request_seconds", "Latency of each HTTP attempt per host")
+REQUEST_RETRIES = REGISTRY.counter("codescraper_http_retries_total", "HTTP attempts retried per host and reason")
+REQUEST_FAILURES = REGISTRY.counter("codescraper_http_failures_total", "HTTP requests that ran out of retries per host")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class RetryingSession(requests.Session):
+    """
+    A keep-alive session with a sized connection pool that retries 429/5xx responses
+    and connection errors with exponential backoff and full jitter. Retry-After is
+    honoured when the server sends one. Every attempt is timed per host, waits for
+    the host's token from the rate governor and reports its outcome back to it.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: Timeout = (5, 30),
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 30,
+                 pool_connections: int = 4, pool_maxsize: int = 16, governor: Optional[RateGovernor] = GOVERNOR):
+        super().__init__()
+        self.governor = governor
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Compressed responses are decoded transparently by urllib3
+        self.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        if headers:
+            self.headers.update(headers)
+        # Retries are ours, so the adapter must not retry underneath us
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        retry_after = _retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname or ""
+        attempt = 0
+        while True:
+            if self.governor:
+                self.governor.acquire(url)
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, host=host)
+                if self.governor and isinstance(e, requests.Timeout):
+                    self.governor.report(url, timed_out=True)
+                if attempt >= self.max_retries:
+                    REQUEST_FAILURES.inc(host=host)
+                    raise
+                reason, response = type(e).__name__, None
+            else:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, host=host)
+                if self.governor:
+                    # Only HTML can be a CAPTCHA page; JSON bodies are not decoded here
+                    is_html = "html" in response.headers.get("Content-Type", "")
+                    self.governor.report(url, response.status_code, response.text if is_html else None,
+                                         redirected=bool(response.history))
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if attempt >= self.max_retries:
+                    REQUEST_FAILURES.inc(host=host)
+                    return response
+                reason = str(response.status_code)
+                response.close()
+
+            delay = self._backoff(attempt, response)
+            REQUEST_RETRIES.inc(host=host, reason=reason)
+            logging.warning(f"{method} {url} failed ({reason}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_sessions: Dict[str, RetryingSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def shared_session(name: str, **kwargs) -> RetryingSession:
+    """
+    Process-wide session per name, so every fetcher of a site reuses the same pool of
+    warm connections. kwargs only apply when the session is first created.
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _sessions[name] = RetryingSession(**kwargs)
+        return session
@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from metrics import count, timed
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _grayscale(data: bytes, size: Tuple[int, int]):
+    # Pillow is only needed for image hashing, so it is imported lazily
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return list(image.convert("L").resize(size, Image.LANCZOS).tobytes())
+
+
+def ahash(data: bytes, size: int = 8) -> int:
+    """Average hash: one bit per pixel of a size x size thumbnail, set where it is brighter than the mean"""
+    pixels = _grayscale(data, (size, size))
+    mean = sum(pixels) / len(pixels)
+    value = 0
+    for pixel in pixels:
+        value = (value << 1) | (pixel > mean)
+    return value
+
+
+def dhash(data: bytes, size: int = 8) -> int:
+    """Difference hash: one bit per horizontal neighbour pair, set where brightness increases"""
+    pixels = _grayscale(data, (size + 1, size))
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            value = (value << 1) | (pixels[row * (size + 1) + col + 1] > left)
+    return value
+
+
+class BKTree:
+    """
+    Metric tree over 64-bit hashes with Hamming distance. A radius query only
+    descends into children whose edge distance lies within [d - radius, d + radius],
+    so near-duplicate lookups touch a small part of the tree instead of every hash.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, values, {distance: child}]
+        self.size = 0
+
+    def add(self, hash_value: int, value) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [hash_value, [value], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(hash_value, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, [value], {}]
+                return
+            node = child
+
+    def search(self, hash_value: int, radius: int) -> List[Tuple[int, object]]:
+        """(distance, value) of every stored hash within radius of hash_value"""
+        results, stack = [], [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash_value, node[0])
+            if distance <= radius:
+                results.extend((distance, value) for value in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+class ImageCache:
+    """
+    Local disk cache of downloaded images, keyed by URL without its query string
+    (maskan-file appends a cache-busting "?v=<date>"). Plain paths and file:// URLs
+    are read in place, so the pipeline runs against a local directory as well.
+    """
+
+    def __init__(self, cache_dir: str = ".image_cache", session=None, timeout: float = 15):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self._session = session
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def session(self):
+        if self._session is None:
+            from http_session import shared_session
+            self._session = shared_session("images")
+        return self._session
+
+    def path(self, url: str) -> str:
+        parts = urlsplit(url)
+        key = hashlib.sha1(f"{parts.netloc}{parts.path}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + os.path.splitext(parts.path)[1].lower())
+
+    def get(self, url: str) -> bytes:
+        parts = urlsplit(url)
+        if parts.scheme in ("", "file"):
+            with open(parts.path if parts.scheme == "file" else url, "rb") as f:
+                return f.read()
+        path = self.path(url)
+        if os.path.exists(path):
+            count("image_cache_hit")
+            with open(path, "rb") as f:
+                return f.read()
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated image in the cache
+        with open(path + ".part", "wb") as f:
+            f.write(response.content)
+        os.replace(path + ".part", path)
+        count("image_downloaded")
+        return response.content
+
+
+class PhotoIndex:
+    """
+    Perceptual hashes of listing photos in a BK-tree keyed by dHash. Two photos
+    match when their dHashes are within max_distance bits and their aHashes agree
+    too, which filters out the rare dHash collision between different pictures.
+    """
+
+    def __init__(self, max_distance: int = 6, ahash_distance: int = 10):
+        self.max_distance = max_distance
+        self.ahash_distance = ahash_distance
+        self.tree = BKTree()
+        self.hashes: Dict[object, List[Tuple[str, int, int]]] = {}  # listing -> [(url, dhash, ahash)]
+
+    def add(self, listing, url: str, d_hash: int, a_hash: int) -> None:
+        self.hashes.setdefault(listing, []).append((url, d_hash, a_hash))
+        self.tree.add(d_hash, (listing, url, a_hash))
+
+    def similar(self, d_hash: int, a_hash: int) -> List[Tuple[int, object, str]]:
+        """(distance, listing, url) of the indexed photos near-identical to the given hashes"""
+        return [(distance, listing, url) for distance, (listing, url, other_a) in self.tree.search(d_hash, self.max_distance)
+                if hamming(a_hash, other_a) <= self.ahash_distance]
+
+    def listings_sharing_photos(self, listing) -> Set[object]:
+        found = set()
+        for _, d_hash, a_hash in self.hashes.get(listing, []):
+            found.update(other for _, other, _ in self.similar(d_hash, a_hash) if other != listing)
+        return found
+
+    def shared_photo_pairs(self) -> Iterator[Tuple[object, object, int]]:
+        """(listing, listing, closest distance) for every pair of listings with a near-identical photo"""
+        closest: Dict[Tuple[object, object], int] = {}
+        for listing, photos in self.hashes.items():
+            for _, d_hash, a_hash in photos:
+                for distance, other, _ in self.similar(d_hash, a_hash):
+                    if other == listing:
+                        continue
+                    pair = tuple(sorted((listing, other), key=str))
+                    closest[pair] = min(distance, closest.get(pair, distance))
+        for (first, second), distance in closest.items():
+            yield first, second, distance
+
+
+def _hash_one(cache: ImageCache, url: str) -> Optional[Tuple[int, int]]:
+    try:
+        data = cache.get(url)
+        return dhash(data), ahash(data)
+    except ImportError:
+        raise
+    except Exception as e:
+        # A missing or broken image only costs that photo, not the listing
+        logging.debug(f"Could not hash {url}: {e}")
+        count("image_hash_failed")
+        return None
+
+
+def build_index(photos: Iterable[Tuple[object, str]], cache: Optional[ImageCache] = None, workers: int = 8,
+                index: Optional[PhotoIndex] = None) -> PhotoIndex:
+    """
+    Download (through the cache) and hash every (listing, url) pair on a bounded
+    thread pool, adding the results to index.
+    """
+    cache = cache or ImageCache()
+    index = index or PhotoIndex()
+    photos = list(photos)
+    with timed("image_hash"), ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for (listing, url), hashes in zip(photos, executor.map(lambda photo: _hash_one(cache, photo[1]), photos)):
+            if hashes:
+                index.add(listing, url, *hashes)
+    count("image_hashed", sum(len(v) for v in index.hashes.values()))
+    return index
+
+
+def listing_photos(listings: Iterable, key: Callable[[object], object] = lambda d: d["id"]):
+    """(listing key, picture url) pairs of listings as select_data() returns them (or listing dicts)"""
+    for listing in listings:
+        for url in listing.get("pictures") or []:
+            yield key(listing), url
+
+
+def directory_photos(path: str) -> Iterator[Tuple[str, str]]:
+    """(file name, path) of every image under path, for trying the pipeline on local files"""
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                full = os.path.join(root, name)
+                yield os.path.relpath(full, path), full
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate photos with perceptual hashes")
+    parser.add_argument("directory", help="directory of images to index")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-distance", type=int, default=6, help="dHash bits two duplicates may differ in")
+    args = parser.parse_args()
+
+    photo_index = build_index(directory_photos(args.directory), workers=args.workers,
+                              index=PhotoIndex(max_distance=args.max_distance))
+    for first, second, bits in sorted(photo_index.shared_photo_pairs(), key=lambda pair: pair[2]):
+        print(f"{bits:2d}  {first}  {second}")
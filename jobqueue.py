@@ -0,0 +1,88 @@
+import logging
+import os
+import socket
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from database_manager import BatchWriter, claim_jobs, complete_jobs, extend_leases, fail_job, release_jobs
+from metrics import count, timed
+
+# A handler turns one job payload into the cleaned listings to store; raising marks the job failed
+Handler = Callable[[str], Iterable[dict]]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Worker:
+    """
+    Claims scrape jobs from the database queue, runs the handler of each job's kind
+    and stores the listings it returns. Any number of workers, in any number of
+    processes or machines, can share one database.
+
+    Jobs are claimed in batches under a lease that is renewed while the batch is
+    worked on; a worker that dies simply lets its lease run out and the jobs go to
+    someone else. A job only counts as done once its listings are committed; if the
+    flush fails, the buffered listings are dropped and the jobs go back to the queue.
+    Failed jobs are retried with exponential delay and dead-lettered after max_attempts.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler], claim_size: int = 10, lease_seconds: float = 300,
+                 max_attempts: int = 3, retry_delay: float = 60, idle_sleep: float = 5,
+                 writer: Optional[BatchWriter] = None, worker_id: Optional[str] = None):
+        self.handlers = handlers
+        self.claim_size = claim_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.idle_sleep = idle_sleep
+        self.writer = writer or BatchWriter(batch_size=100)
+        self.worker_id = worker_id or default_worker_id()
+        self.jobs_claimed = 0
+        self.jobs_done = 0
+
+    def _run_batch(self, token: str, jobs: List[dict]) -> None:
+        succeeded = []
+        renewed_at = time.monotonic()
+        for index, job in enumerate(jobs):
+            if time.monotonic() - renewed_at > self.lease_seconds / 2:
+                extend_leases([j["id"] for j in jobs[index:]], token, self.lease_seconds)
+                renewed_at = time.monotonic()
+            try:
+                with timed(f"job_{job['kind']}"):
+                    # Collected first: a handler that raises halfway leaves nothing behind for its retry to repeat
+                    listings = list(self.handlers[job["kind"]](job["payload"]))
+                for listing in listings:
+                    self.writer.add(listing)
+                succeeded.append(job["id"])
+            except Exception as e:
+                logging.warning(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+                fail_job(job, token, e, self.max_attempts, self.retry_delay)
+        # Listings first, then the jobs: a crash in between only repeats work, never loses it
+        if not self.writer.flush():
+            # The jobs bring their listings again when retried, so the unwritten copies are dropped
+            dropped = self.writer.discard()
+            logging.warning(f"{dropped} listings of {len(succeeded)} jobs could not be stored, releasing the jobs")
+            release_jobs(succeeded, token, self.retry_delay)
+            return
+        complete_jobs(succeeded, token)
+        count("job_done", len(succeeded))
+        self.jobs_done += len(succeeded)
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_idle: bool = False) -> int:
+        """Work until max_jobs were claimed, or until the queue is empty when exit_when_idle is set"""
+        kinds = list(self.handlers)
+        logging.info(f"Worker {self.worker_id} started for {', '.join(kinds)}")
+        while max_jobs is None or self.jobs_claimed < max_jobs:
+            limit = self.claim_size if max_jobs is None else min(self.claim_size, max_jobs - self.jobs_claimed)
+            token, jobs = claim_jobs(kinds, limit, self.lease_seconds, self.worker_id)
+            self.jobs_claimed += len(jobs)
+            if jobs:
+                self._run_batch(token, jobs)
+            elif exit_when_idle:
+                break
+            else:
+                time.sleep(self.idle_sleep)
+        logging.info(f"Worker {self.worker_id} finished {self.jobs_done} jobs")
+        return self.jobs_done
@@ -0,0 +1,151 @@
+import argparse
+import random
+import sys
+import tracemalloc
+from typing import Iterable, List, Mapping, Sequence
+
+# Every field a listing carries between the scrapers, the cleaners, the DB layer and
+# PropertySimilarity, in the order of Listing.from_row
+FIELDS = ("id", "file_code", "title", "address", "total_price", "price_per_meter", "mortgage", "rent", "area",
+          "number_of_rooms", "year_of_manufacture", "facilities", "pictures", "is_rental",
+          "latitude", "longitude", "district", "neighborhood", "street")
+
+_FIELD_SET = frozenset(FIELDS)
+
+
+# One real estate listing in fixed slots instead of a dict, with a dict-like API for older code
+class Listing:
+    __slots__ = FIELDS
+
+    def __init__(self, id=None, file_code="", title="", address="", total_price=None, price_per_meter=None,
+                 mortgage=None, rent=None, area=None, number_of_rooms=None, year_of_manufacture=None,
+                 facilities=(), pictures=(), is_rental=None, latitude=None, longitude=None, district=None,
+                 neighborhood=None, street=None):
+        self.id = id
+        self.file_code = file_code
+        self.title = title
+        self.address = address
+        self.total_price = total_price
+        self.price_per_meter = price_per_meter
+        self.mortgage = mortgage
+        self.rent = rent
+        self.area = area
+        self.number_of_rooms = number_of_rooms
+        self.year_of_manufacture = year_of_manufacture
+        self.facilities = facilities
+        self.pictures = pictures
+        self.is_rental = is_rental
+        self.latitude = latitude
+        self.longitude = longitude
+        self.district = district
+        self.neighborhood = neighborhood
+        self.street = street
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "Listing":
+        if isinstance(data, Listing):
+            return data.copy()
+        return cls(**{name: data[name] for name in FIELDS if name in data})
+
+    @classmethod
+    def from_row(cls, values: Sequence) -> "Listing":
+        # A DB row selected as the columns of FIELDS; repeated facility names are interned
+        listing = cls(*values)
+        listing.facilities = tuple(sys.intern(name) for name in listing.facilities or ())
+        listing.pictures = tuple(listing.pictures or ())
+        if listing.neighborhood:
+            listing.neighborhood = sys.intern(listing.neighborhood)
+        return listing
+
+    @classmethod
+    def coerce(cls, listing) -> "Listing":
+        return listing if isinstance(listing, Listing) else cls.from_dict(listing)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in FIELDS}
+
+    # Mapping-style access, for code that still treats a listing as a dict
+    def __getitem__(self, name):
+        if name not in _FIELD_SET:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in _FIELD_SET:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in _FIELD_SET
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in _FIELD_SET else default
+
+    def keys(self):
+        return FIELDS
+
+    def copy(self) -> "Listing":
+        listing = Listing.__new__(Listing)
+        for name in FIELDS:
+            setattr(listing, name, getattr(self, name))
+        return listing
+
+    def update(self, values: Mapping) -> None:
+        for name, value in values.items():
+            self[name] = value
+
+    def __eq__(self, other):
+        if not isinstance(other, Listing):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Listing(id={self.id!r}, file_code={self.file_code!r}, title={self.title!r})"
+
+
+def listings(rows: Iterable[Mapping]) -> List[Listing]:
+    return [Listing.coerce(row) for row in rows]
+
+
+def _synthetic_row(i: int, rng: random.Random) -> tuple:
+    # Shaped like a stored listing: every string and list is its own object, as after a DB read
+    facilities = ["پارکینگ", "آسانسور", "انباری", "تراس", "کمد دیواری", "بالکن"]
+    rental = rng.random() < 0.4
+    return (i, str(2700000 + i), f"آپارتمان {rng.randint(40, 250)} متر {i % 97}",
+            f"منطقه {rng.randint(1, 13)} محله {i % 211} خیابان {i % 977} پلاک {i % 61}",
+            None if rental else float(rng.randint(1, 50) * 10 ** 9), None,
+            float(rng.randint(1, 9) * 10 ** 8) if rental else None, float(rng.randint(1, 9) * 10 ** 7) if rental else None,
+            rng.randint(40, 250), rng.randint(1, 4), rng.randint(0, 30),
+            ["".join(name) for name in rng.sample(facilities, rng.randint(0, 5))],
+            [f"https://maskan-file.ir/img/FilesImages/{i}_{n}.jpg" for n in range(rng.randint(0, 3))],
+            rental, None, None, rng.randint(1, 13), f"محله {i % 211}", None)
+
+
+# Memory held by count synthetic listings as dicts and as Listing records, values included
+def benchmark(count: int = 100_000, seed: int = 1) -> dict:
+    results = {}
+    for name, build in (("dict", lambda row: dict(zip(FIELDS, row))), ("Listing", Listing.from_row)):
+        rng = random.Random(seed)
+        tracemalloc.start()
+        built = [build(_synthetic_row(i, rng)) for i in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[name] = {"bytes": size, "bytes_per_listing": size / count}
+        del built
+    results["saved_bytes"] = results["dict"]["bytes"] - results["Listing"]["bytes"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of listings held as dicts vs Listing records")
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    report = benchmark(args.count)
+    for kind in ("dict", "Listing"):
+        print(f"{kind:8s} {report[kind]['bytes'] / 2 ** 20:9.1f} MiB  "
+              f"{report[kind]['bytes_per_listing']:7.0f} B/listing")
+    print(f"saved    {report['saved_bytes'] / 2 ** 20:9.1f} MiB "
+          f"({report['saved_bytes'] / report['dict']['bytes']:.0%}) for {args.count} listings")
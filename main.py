@@ -1,83 +1,416 @@
-import time, random
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from maskan_file_new import Maskan_File as MaskanDetcNew
 from maskan_file_old import Maskan_File as MaskanDectOld
-from maskan_file import RealEstateCleaner, RealEstateScraper
-from melkemun import EstateManager
+from maskan_file import RealEstateCleaner, RealEstateScraper, file_code_from_url
+from maskan_http import discover_links
+from melkemun import EstateFetcher, EstateManager, MultiCityIngestor, ShardedBackfill
 from melkemun_cleaner import MelkemunEstateCleaner
-from database_manager import create_data, select_data, create_sim, select_similarity_pairs
+from clusters import update_clusters
+from dedup import IngestDeduplicator
+from database_manager import (BatchWriter, bulk_create_sim, clear_rescore, enqueue_jobs, job_counts, replace_similarities,
+                              backfill_address_fields, listings_in, listings_near, select_clusters, select_data, select_rescore_ids, select_similarity_pairs)
 from similarity_algorithm import PropertySimilarity
+from similarity_index import SimilarityIndex, shared_index
+from snapshot import load_snapshot
+from pipeline import Pipeline, Stage
+from scheduler import AdaptiveInterval, Scheduler, Source
+from seen_filter import SeenListingFilter
+from checkpoint import Checkpoint
+from jobqueue import Worker
+from image_hash import ImageCache, PhotoIndex, build_index, listing_photos
 from tabulate import tabulate
+import metrics
 
-def maskan_scraper(property_codes):
-    for property_code in property_codes:
-            scraper = RealEstateScraper(property_code)
+MASKAN_URL = "https://maskan-file.ir/Site/Default.aspx"
+
+# Jobs whose progress is checkpointed in the DB, so an interrupted backfill resumes
+MASKAN_BACKFILL_JOB = "maskan-backfill"
+MELKEMUN_BACKFILL_JOB = "melkemun-backfill"
+MELKEMUN_WATERMARK_JOB = "melkemun-watermarks"
+
+# Stored maskan file codes, loaded from the DB on first use, so listings still on
+# the front page are dropped before a Chrome instance is spent on them
+seen_listings = SeenListingFilter()
+
+# Matches every stored listing against the in-memory similarity index and clusters
+# duplicates in the insert's transaction; shared by all sources of the process
+ingest_dedup = IngestDeduplicator()
+
+def _writer(batch_size=1, on_write=None):
+    return BatchWriter(batch_size, on_write=on_write, on_stored=ingest_dedup)
+
+def maskan_pipeline(property_codes, writer, workers=1, clean_workers=1, persist_workers=1, queue_size=100,
+                    checkpoint=None):
+    # Discovery, fetch, clean and persist run concurrently with bounded queues in between
+    def fetch(property_code):
+        scraper = RealEstateScraper(property_code)
+        property_data = None
+        try:
             property_data = scraper.scrape()
+        finally:
+            if property_data is None and checkpoint:
+                checkpoint.failed([checkpoint.key(property_code)])
+        return property_data
+
+    def clean(property_data):
+        cleaner = RealEstateCleaner()
+        cleaned_data = cleaner.clean(property_data)
+        if not cleaned_data and checkpoint:
+            checkpoint.dropped([property_data.get("file_code")])
+        return cleaned_data or None
+
+    def persist(cleaned_data):
+        # Duplicates are detected when the writer stores the listing, see ingest_dedup
+        writer.add(cleaned_data)
+        seen_listings.add(cleaned_data["file_code"])
+        return cleaned_data
 
-            cleaner = RealEstateCleaner()
-            cleaned_data = cleaner.clean(property_data)
+    return Pipeline(property_codes, [
+        Stage("fetch", fetch, workers, queue_size),
+        Stage("clean", clean, clean_workers, queue_size),
+        Stage("persist", persist, persist_workers, queue_size),
+    ], report_interval=60)
 
-            # TODO:  algorythm moshabeh here
+def maskan_scraper(property_codes, workers=1, writer=None):
+    writer = writer or _writer()
+    pipeline = maskan_pipeline(property_codes, writer, workers)
+    pipeline.run()
+    writer.flush()
+    return pipeline.produced
 
-            create_data(cleaned_data)
-            print("One data added")
+def _remaining(max_items, processed):
+    return None if max_items is None else max(max_items - processed, 0)
 
-def maskan():
-    # fetch old data
-    detector_old = MaskanDectOld("https://maskan-file.ir/Site/Default.aspx")
-    old_property_codes = detector_old.run()
+def _sleep_interval(interval):
+    time.sleep(random.uniform(interval, interval * 1.5)) #Use random delays to mimic human browsing patterns
 
-    # scrap data and put old data in database
-    maskan_scraper(old_property_codes)
-    print("Old data have been added to database.")
+def maskan_discovery(once=False, interval=20, backfill=True, checkpoint=None):
+    if backfill:
+        # fetch old data
+        # The detector filters each page itself and stops at the first page of stored listings
+        def discover():
+            return discover_links(MASKAN_URL, max_pages=None, filter_new=seen_listings.filter_new,
+                                  fallback=lambda start_page: MaskanDectOld(
+                                      MASKAN_URL, filter_new=seen_listings.filter_new, start_page=start_page))
+
+        # A saved frontier of an interrupted backfill is resumed instead of rediscovered
+        yield from checkpoint.frontier(discover) if checkpoint else discover()
+        print("Old data have been discovered.")
 
     while True:
-        
         print("new scraping started.")
-        detector = MaskanDetcNew("https://maskan-file.ir/Site/Default.aspx")
-        new_property_codes = detector.run()
-        
-        # scrap data and put new data in database
-        maskan_scraper(new_property_codes)
+        # Plain HTTP first; the Selenium detector only runs if that fails
+        yield from seen_listings.filter_new(discover_links(MASKAN_URL, fallback=lambda start_page: MaskanDetcNew(MASKAN_URL)))
+
+        if once:
+            return
+        _sleep_interval(interval)
 
-        time.sleep(random.uniform(20, 30)) #Use random delays to mimic human browsing patterns
+def maskan(once=False, max_items=None, workers=1, batch_size=1, interval=20, backfill=True,
+           clean_workers=1, persist_workers=1, queue_size=100, fresh=False):
+    checkpoint = Checkpoint(MASKAN_BACKFILL_JOB, key=file_code_from_url) if backfill else None
+    if checkpoint and fresh:
+        checkpoint.reset()
 
-def melkmun_scraper(n):
+    def written(batch):
+        # Items only count as done once their batch is in the DB
+        if checkpoint:
+            checkpoint.done(data["file_code"] for data in batch)
+
+    with _writer(batch_size, on_write=written) as writer:
+        property_codes = islice(maskan_discovery(once, interval, backfill, checkpoint), max_items)
+        pipeline = maskan_pipeline(property_codes, writer, workers, clean_workers, persist_workers, queue_size,
+                                   checkpoint)
+        stats = pipeline.run()
+    for name, stage_stats in stats.items():
+        print(f"{name}: {stage_stats['processed']} done, {stage_stats['dropped']} dropped, "
+              f"{stage_stats['throughput']:.2f}/s, {stage_stats['utilization']:.0%} busy")
+    print(f"bottleneck stage: {pipeline.bottleneck()}")
+    return pipeline.produced
+
+def melkmun_scraper(n, workers=1, writer=None, page_size=20, checkpoint=None):
+    # Pages are fetched concurrently by offset, then cleaned and written in order
     manager = EstateManager()
-    for n in range(0,n):
-        estate_data = manager.get_estate_by_index(n)
+    writer = writer or _writer()
+    start = checkpoint.get("next_offset", 0) if checkpoint else 0
+    offsets = range(start, n, page_size)
+    processed = 0
 
-        cleaner = MelkemunEstateCleaner()
-        cleaned_data = cleaner.clean(estate_data)
+    def fetch_page(offset):
+        return manager.fetcher.fetch(limit=min(page_size, n - offset), offset=offset)
 
-        # TODO:  algorithm here
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for offset, estates_raw in zip(offsets, executor.map(fetch_page, offsets)):
+            for estate_data in estates_raw:
+                cleaner = MelkemunEstateCleaner(estate_data)
+                cleaned_data = cleaner.clean()
+                processed += 1
+                if not cleaned_data:
+                    continue
 
-        create_data(cleaned_data)
+                writer.add(cleaned_data)
+            # The offset only moves past a page once all of its listings are stored
+            if checkpoint and writer.flush():
+                checkpoint.update(next_offset=offset + page_size)
+    writer.flush()
+    return processed
 
-def melkmun():
-    # getting the old data (old scraper) and save in database
-    melkmun_scraper(20)
+def melkmun_sharded_backfill(workers=1, writer=None, shards=8, date_from=None, date_to=None, max_items=None,
+                             city_id=2):
+    # The date range is split into shards fetched concurrently; records arrive deduplicated by id
+    fetcher = EstateFetcher(city_id=city_id)
+    fetcher.date_from = date_from or fetcher.date_from
+    fetcher.date_to = date_to or fetcher.date_to
+    backfill = ShardedBackfill(fetcher, shards=shards, workers=workers)
+    writer = writer or _writer()
+    processed = 0
+    for estate_data in islice(backfill.run(), max_items):
+        cleaned_data = MelkemunEstateCleaner(estate_data).clean()
+        processed += 1
+        if cleaned_data:
+            writer.add(cleaned_data)
+    writer.flush()
+    return processed
 
-    print("Old data have been added to database.")
+def melkmun_cities(city_ids, once=False, max_items=None, workers=1, batch_size=1, interval=20, shards=None,
+                   date_from=None, date_to=None):
+    # All cities share one session, one rate budget and one batched writer
+    processed = 0
+    checkpoint = Checkpoint(MELKEMUN_WATERMARK_JOB)
+    ingestor = MultiCityIngestor(city_ids, workers=workers, watermarks=checkpoint.get("cities"))
+    with _writer(batch_size) as writer:
+        if shards:
+            for city_id in city_ids:
+                limit = _remaining(max_items, processed)
+                processed += melkmun_sharded_backfill(workers, writer, shards, date_from, date_to, limit, city_id)
+            print("Old data have been added to database.")
 
-    while True:
-        time.sleep(random.uniform(20, 30)) #Use random delays to mimic human browsing patterns
-        print("new scraping started.")
+        while _remaining(max_items, processed) != 0:
+            print("new scraping started.")
+            for city_id, estates_raw in ingestor.poll():
+                estates_raw = list(islice(estates_raw, _remaining(max_items, processed)))
+                for estate_data in estates_raw:
+                    cleaned_data = MelkemunEstateCleaner(estate_data).clean()
+                    processed += 1
+                    if cleaned_data:
+                        writer.add(cleaned_data)
+                ingestor.advance(city_id, estates_raw)
+            # Watermarks only move once the listings they cover are stored; a failed write keeps
+            # the saved ones, so a restart fetches those listings again
+            if writer.flush():
+                checkpoint.update(cities=ingestor.watermarks)
+
+            if once:
+                break
+            _sleep_interval(interval)
+    return processed
+
+def melkmun(once=False, max_items=None, workers=1, batch_size=1, interval=20, backfill_items=20, poll_items=10,
+            fresh=False, shards=None, date_from=None, date_to=None):
+    processed = 0
+    with _writer(batch_size) as writer:
+        # getting the old data (old scraper) and save in database
+        if shards:
+            # The whole date window instead of the newest backfill_items listings
+            processed += melkmun_sharded_backfill(workers, writer, shards, date_from, date_to, max_items)
+        else:
+            backfill_limit = backfill_items if max_items is None else min(backfill_items, max_items)
+            # Resume an interrupted backfill of the same size; a finished or different one starts over
+            checkpoint = Checkpoint(MELKEMUN_BACKFILL_JOB)
+            if fresh or checkpoint.get("total") != backfill_limit or checkpoint.get("next_offset", 0) >= backfill_limit:
+                checkpoint.reset()
+                checkpoint.update(total=backfill_limit)
+            processed += melkmun_scraper(backfill_limit, workers, writer, checkpoint=checkpoint)
+
+        print("Old data have been added to database.")
 
-        # getting the new data (new scraper) and save in database
-        melkmun_scraper(10)
+        while _remaining(max_items, processed) != 0:
+            _sleep_interval(interval)
+            print("new scraping started.")
 
-def similarity_checker():
-    all_data = select_data()
-    similarity_check = PropertySimilarity()
-    check_results = similarity_check.compare_properties(properties=all_data)
+            # getting the new data (new scraper) and save in database
+            limit = poll_items if max_items is None else min(poll_items, _remaining(max_items, processed))
+            processed += melkmun_scraper(limit, workers, writer)
+
+            if once:
+                break
+    return processed
+
+def similarity_checker(snapshot_path=None, workers=1, radius_km=None, same_district=False):
+    # A columnar snapshot (see snapshot.py) avoids pulling the whole table through the ORM
+    all_data = list(load_snapshot(snapshot_path).listings) if snapshot_path else select_data()
+    similarity_check = PropertySimilarity(radius_km=radius_km, same_district=same_district)
+    check_results = similarity_check.compare_properties(properties=all_data, workers=workers)
     return check_results
 
-def similarity():
-    datas = similarity_checker() 
-    for data in datas:
-        create_sim(data)
+def similarity_incremental(workers=1, store_pairs=False, radius_km=None, same_district=False):
+    # Only listings inserted or changed since the last run are rescored, against all others
+    rescore = select_rescore_ids()
+    if not rescore:
+        print("no new or changed listings to score")
+        return
+    checker = PropertySimilarity(radius_km=radius_km, same_district=same_district)
+    datas = checker.compare_changed(select_data(), rescore, workers=workers)
+    update_clusters(datas)
+    if store_pairs:
+        replace_similarities(rescore, datas)
+    clear_rescore(rescore)
+    print(f"sim data of {len(rescore)} listings updated in database")
+
+def similarity(snapshot_path=None, workers=1, batch_size=1000, incremental=False, store_pairs=False,
+               radius_km=None, same_district=False):
+    if incremental:
+        return similarity_incremental(workers, store_pairs, radius_km, same_district)
+    # A full run from the DB scores the flagged listings too; a snapshot may predate their change
+    rescore = {} if snapshot_path else select_rescore_ids()
+    datas = similarity_checker(snapshot_path, workers, radius_km, same_district)
+    # Duplicate clusters are rebuilt from scratch; the pair table is only kept on request
+    clusters = update_clusters(datas, rebuild=True)
+    if store_pairs:
+        for start in range(0, len(datas), batch_size):
+            bulk_create_sim(datas[start:start + batch_size])
+    clear_rescore(rescore)
+
+    print(f"sim data added to database: {len(clusters.members())} duplicate clusters")
+
+def schedule(sources=("maskan", "melkemun"), once=False, max_items=None, workers=1, batch_size=1, interval=20,
+             min_interval=5, max_interval=600, poll_items=10, run_similarity=True, similarity_cooldown=300):
+    # Every source gets its own writer so the inserted count of a poll is its own
+    maskan_writer, melkemun_writer = _writer(batch_size), _writer(batch_size)
+
+    def maskan_poll():
+        before = maskan_writer.inserted
+        links = discover_links(MASKAN_URL, fallback=lambda start_page: MaskanDetcNew(MASKAN_URL))
+        maskan_scraper(seen_listings.filter_new(links), workers, maskan_writer)
+        return maskan_writer.inserted - before
+
+    def melkemun_poll():
+        before = melkemun_writer.inserted
+        melkmun_scraper(poll_items, workers, melkemun_writer)
+        return melkemun_writer.inserted - before
+
+    polls = {"maskan": maskan_poll, "melkemun": melkemun_poll}
+    scheduler = Scheduler(
+        [Source(name, polls[name], AdaptiveInterval(interval, min_interval, max_interval)) for name in sources],
+        on_ingest=(lambda: similarity(incremental=True)) if run_similarity else None,
+        ingest_cooldown=similarity_cooldown,
+        max_polls=1 if once else None,
+        max_items=max_items,
+    )
+    scheduler.run()
+    return scheduler.total_items
+
+# Job queue handlers: one payload in, cleaned listings out (see jobqueue.Worker)
+def maskan_job(url):
+    property_data = RealEstateScraper(url).scrape()
+    if property_data is None:
+        # Raising lets the queue retry the URL later instead of marking it done
+        raise RuntimeError(f"could not scrape {url}")
+    cleaned_data = RealEstateCleaner().clean(property_data)
+    return [cleaned_data] if cleaned_data else []
 
-    print("sim data added to database")
+def melkemun_job(payload):
+    page = json.loads(payload)
+    fetcher = EstateFetcher(city_id=page["city_id"])
+    estates_raw = fetcher.fetch(limit=page["limit"], offset=page["offset"],
+                                date_from=page.get("date_from"), date_to=page.get("date_to"))
+    return [cleaned for cleaned in (MelkemunEstateCleaner(e).clean() for e in estates_raw) if cleaned]
+
+JOB_HANDLERS = {"maskan": maskan_job, "melkemun": melkemun_job}
+
+def enqueue(source, backfill=False, items=20, page_size=20, cities=(2,)):
+    # Discovery runs here once; the fetching is left to any number of workers
+    if source == "maskan":
+        if backfill:
+            links = discover_links(MASKAN_URL, max_pages=None, filter_new=seen_listings.filter_new,
+                                   fallback=lambda start_page: MaskanDectOld(
+                                       MASKAN_URL, filter_new=seen_listings.filter_new, start_page=start_page))
+        else:
+            links = seen_listings.filter_new(discover_links(MASKAN_URL, fallback=lambda start_page: MaskanDetcNew(MASKAN_URL)))
+        added = enqueue_jobs("maskan", links)
+    else:
+        fetcher = EstateFetcher()
+        # The window is part of the payload, so the same page enqueued twice is one job
+        payloads = [json.dumps({"city_id": city_id, "offset": offset, "limit": min(page_size, items - offset),
+                                "date_from": fetcher.date_from, "date_to": fetcher.date_to}, sort_keys=True)
+                    for city_id in cities for offset in range(0, items, page_size)]
+        added = enqueue_jobs("melkemun", payloads)
+    print(f"{added} {source} jobs enqueued.")
+    return added
+
+def run_worker(kinds=("maskan", "melkemun"), claim_size=10, batch_size=100, lease_seconds=300, max_attempts=3,
+               max_jobs=None, exit_when_idle=False, dedup=True):
+    # Each worker process keeps its own index for ingest dedup, built before the first claim
+    ingest_dedup.enabled = dedup
+    ingest_dedup.warm()
+    with _writer(batch_size) as writer:
+        worker = Worker({kind: JOB_HANDLERS[kind] for kind in kinds}, claim_size=claim_size,
+                        lease_seconds=lease_seconds, max_attempts=max_attempts, writer=writer)
+        return worker.run(max_jobs=max_jobs, exit_when_idle=exit_when_idle)
+
+def start_workers(processes=1, **options):
+    if processes == 1:
+        return run_worker(**options)
+    # Spawned, not forked, so no child inherits the parent's pooled DB connections
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=run_worker, kwargs=options, name=f"worker-{n}") for n in range(processes)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+def print_jobs():
+    rows = [[kind, status, n] for (kind, status), n in sorted(job_counts().items())]
+    print(tabulate(rows, headers=["Kind", "Status", "Jobs"], tablefmt="github"))
+
+def print_shared_photos(snapshot_path=None, workers=8, cache_dir=".image_cache", max_distance=6):
+    # Listings reposted under another file code usually reuse the same photos
+    listings = list(load_snapshot(snapshot_path).listings) if snapshot_path else select_data()
+    file_codes = {listing["id"]: listing["file_code"] for listing in listings}
+    index = build_index(listing_photos(listings), ImageCache(cache_dir), workers, PhotoIndex(max_distance))
+    rows = [[first, file_codes.get(first), second, file_codes.get(second), bits]
+            for first, second, bits in sorted(index.shared_photo_pairs(), key=lambda pair: pair[2])]
+    print(tabulate(rows, headers=["Data 1 ID", "Data 1 File Code", "Data 2 ID", "Data 2 File Code", "Photo Distance"],
+                   tablefmt="github"))
+
+def print_similar_to(listing, k=10, min_score=70, snapshot_path=None):
+    # listing is an id or a file code; building the index is paid once, each query after is fast
+    index = SimilarityIndex(load_snapshot(snapshot_path).listings) if snapshot_path else shared_index()
+    listing_id = index.resolve(listing)
+    if listing_id is None:
+        print(f"no listing with id or file code {listing}")
+        return
+    start = time.perf_counter()
+    matches = index.find_similar(listing_id, k=k, min_score=min_score)
+    elapsed = time.perf_counter() - start
+    components = list(PropertySimilarity().weight_config)
+    rows = [[m["id"], m["file_code"], m["similarity"]] + [m["components"].get(name, 0) for name in components]
+            for m in matches]
+    print(tabulate(rows, headers=["ID", "File Code", "Similarity"] + components, tablefmt="github", floatfmt=".2f"))
+    print(f"{len(matches)} matches among {len(index)} listings in {elapsed * 1000:.1f}ms")
+
+def print_near(lat, lon, radius_km=1.0, limit=50):
+    listings = listings_near(lat, lon, radius_km, limit)
+    rows = [[distance, d.id, d.file_code, d.title, d.total_price, d.mortgage, d.rent, d.area, d.number_of_rooms]
+            for distance, d in listings]
+    print(tabulate(rows, headers=["Distance (km)", "ID", "File Code", "Title", "Total Price", "Mortgage", "Rent",
+                                  "Area", "Rooms"], tablefmt="github", floatfmt=".3f"))
+    print(f"{len(listings)} listings within {radius_km}km")
+
+def print_district(district=None, neighborhood=None, limit=50):
+    listings = listings_in(district, neighborhood, limit)
+    rows = [[d.id, d.file_code, d.district, d.neighborhood, d.title, d.total_price, d.mortgage, d.rent, d.area,
+             d.number_of_rooms] for d in listings]
+    print(tabulate(rows, headers=["ID", "File Code", "District", "Neighborhood", "Title", "Total Price", "Mortgage",
+                                  "Rent", "Area", "Rooms"], tablefmt="github", floatfmt=".2f"))
+    print(f"{len(listings)} listings")
 
 def print_similiar_files():
     pairs = select_similarity_pairs()
@@ -124,17 +457,38 @@ def print_similiar_files():
     # Print the table using tabulate
     print(tabulate(rows, headers=headers,tablefmt="github", stralign="right", floatfmt=".2f"))
     
+def print_clusters(members=True):
+    clusters = select_clusters()
+    rows = []
+    for cluster in clusters:
+        representative = cluster["representative"] or {}
+        row = [cluster["cluster_id"], cluster["size"], representative.get("id"), representative.get("file_code"),
+               representative.get("title"), representative.get("total_price"), representative.get("mortgage"),
+               representative.get("rent"), representative.get("area"), representative.get("number_of_rooms")]
+        if members:
+            row.append(" ".join(str(m["file_code"] or m["id"]) for m in cluster["members"]))
+        rows.append(row)
+    headers = ["Cluster ID", "Size", "Representative ID", "File Code", "Title", "Total Price", "Mortgage", "Rent",
+               "Area", "Rooms"] + (["Members"] if members else [])
+    print(tabulate(rows, headers=headers, tablefmt="github", stralign="right", floatfmt=".2f"))
+    print(f"{len(clusters)} clusters, {sum(c['size'] for c in clusters)} listings")
+
 def menu():
+    """
+    The original interactive menu, kept for compatibility: `python main.py` with no
+    subcommand still opens it. Every option is also an argparse subcommand (see main()).
+    """
     while True:
         print("""choose the site you want data from:
               1.maskan
               2.melkmun
               3.similarity check
               4.show similar files information
+              5.show duplicate clusters
               0.exit
               """)
         
-        user_choice = input("Enter here(1-4): ")
+        user_choice = input("Enter here(1-5): ")
 
         if user_choice == "1":
             maskan()
@@ -144,8 +498,201 @@ def menu():
             similarity()
         elif user_choice == "4":
             print_similiar_files()
+        elif user_choice == "5":
+            print_clusters()
         elif user_choice == "0":
             break
         else: print("please enter correctly.")
-        
-menu()
\ No newline at end of file
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return number
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Real estate listing scraper and duplicate finder")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Knobs shared by every long-running command
+    run_options = argparse.ArgumentParser(add_help=False)
+    run_options.add_argument("--once", action="store_true", help="stop after the first polling round")
+    run_options.add_argument("--max-items", type=_positive_int, help="stop after processing this many listings")
+    run_options.add_argument("--workers", type=_positive_int, default=1, help="concurrent fetch workers")
+    run_options.add_argument("--batch-size", type=_positive_int, default=1, help="listings per DB write")
+    run_options.add_argument("--interval", type=float, default=20, help="base delay in seconds between polls")
+
+    run_options.add_argument("--no-dedup", dest="dedup", action="store_false",
+                             help="do not match stored listings against the similarity index at ingest")
+
+    # Only the scrape commands backfill, so only they checkpoint
+    backfill_options = argparse.ArgumentParser(add_help=False)
+    backfill_options.add_argument("--fresh", action="store_true",
+                                  help="discard the checkpoint of an interrupted backfill instead of resuming it")
+
+    scrape_parser = subparsers.add_parser("scrape", help="scrape listings from a source")
+    sources = scrape_parser.add_subparsers(dest="source", required=True)
+    maskan_parser = sources.add_parser("maskan", parents=[run_options, backfill_options], help="maskan-file.ir")
+    maskan_parser.add_argument("--no-backfill", dest="backfill", action="store_false",
+                               help="skip the initial 'load more' crawl of older listings")
+    maskan_parser.add_argument("--clean-workers", type=_positive_int, default=1)
+    maskan_parser.add_argument("--persist-workers", type=_positive_int, default=1)
+    maskan_parser.add_argument("--queue-size", type=_positive_int, default=100,
+                               help="bounded queue length between pipeline stages")
+    melkemun_parser = sources.add_parser("melkemun", parents=[run_options, backfill_options], help="melkemun.com")
+    melkemun_parser.add_argument("--backfill-items", type=int, default=20)
+    melkemun_parser.add_argument("--poll-items", type=_positive_int, default=10)
+    melkemun_parser.add_argument("--shards", type=_positive_int,
+                                 help="backfill the whole date window as this many concurrently fetched date shards")
+    melkemun_parser.add_argument("--date-from", help="start of the sharded backfill window, e.g. 2024-05-19T00:00:00.000Z")
+    melkemun_parser.add_argument("--date-to", help="end of the sharded backfill window")
+    melkemun_parser.add_argument("--cities", type=int, nargs="+",
+                                 help="poll these loc_city_ids concurrently, each from its own watermark")
+
+    schedule_parser = subparsers.add_parser("schedule", parents=[run_options],
+                                            help="poll several sources side by side with adaptive intervals")
+    schedule_parser.add_argument("--sources", nargs="+", choices=["maskan", "melkemun"], default=["maskan", "melkemun"])
+    schedule_parser.add_argument("--min-interval", type=float, default=5)
+    schedule_parser.add_argument("--max-interval", type=float, default=600)
+    schedule_parser.add_argument("--poll-items", type=_positive_int, default=10, help="melkemun listings per poll")
+    schedule_parser.add_argument("--no-similarity", dest="run_similarity", action="store_false",
+                                 help="do not update similarity after polls that added listings")
+    schedule_parser.add_argument("--similarity-cooldown", type=float, default=300,
+                                 help="minimum seconds between similarity updates")
+
+    similarity_parser = subparsers.add_parser("similarity", help="score all listing pairs and store the matches")
+    similarity_parser.add_argument("--workers", type=_positive_int, default=1, help="scoring processes")
+    similarity_parser.add_argument("--batch-size", type=_positive_int, default=1000, help="pairs per DB write")
+    similarity_parser.add_argument("--snapshot", help="read listings from a snapshot directory instead of the DB")
+    similarity_parser.add_argument("--incremental", action="store_true",
+                                   help="only rescore listings inserted or changed since the last run")
+    similarity_parser.add_argument("--pairs", dest="store_pairs", action="store_true",
+                                   help="also store every matching pair for the report command")
+    similarity_parser.add_argument("--radius", type=float,
+                                   help="only compare listings with coordinates within this many km (default: any distance)")
+    similarity_parser.add_argument("--same-district", action="store_true",
+                                   help="only compare listings whose parsed districts match (or are unknown)")
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="discover listings and queue them for workers")
+    enqueue_parser.add_argument("source", choices=["maskan", "melkemun"])
+    enqueue_parser.add_argument("--backfill", action="store_true", help="maskan: crawl all 'load more' pages")
+    enqueue_parser.add_argument("--items", type=_positive_int, default=20, help="melkemun: listings per city")
+    enqueue_parser.add_argument("--page-size", type=_positive_int, default=20, help="melkemun: listings per job")
+    enqueue_parser.add_argument("--cities", type=int, nargs="+", default=[2], help="melkemun: loc_city_ids")
+
+    worker_parser = subparsers.add_parser("worker", help="claim queued jobs from the DB and scrape them")
+    worker_parser.add_argument("--kinds", nargs="+", choices=sorted(JOB_HANDLERS), default=sorted(JOB_HANDLERS))
+    worker_parser.add_argument("--processes", type=_positive_int, default=1, help="local worker processes")
+    worker_parser.add_argument("--claim-size", type=_positive_int, default=10, help="jobs claimed per round trip")
+    worker_parser.add_argument("--batch-size", type=_positive_int, default=100, help="listings per DB write")
+    worker_parser.add_argument("--no-dedup", dest="dedup", action="store_false",
+                               help="do not match stored listings against the similarity index at ingest")
+    worker_parser.add_argument("--lease", type=float, default=300, help="seconds a claim is held before it expires")
+    worker_parser.add_argument("--max-attempts", type=_positive_int, default=3,
+                               help="attempts before a job is dead-lettered")
+    worker_parser.add_argument("--max-jobs", type=_positive_int, help="stop after claiming this many jobs")
+    worker_parser.add_argument("--exit-when-idle", action="store_true", help="stop once nothing is claimable")
+
+    subparsers.add_parser("jobs", help="print the job queue by kind and status")
+    similar_parser = subparsers.add_parser("similar", help="top-k listings most similar to one listing")
+    similar_parser.add_argument("listing", help="listing id or file code")
+    similar_parser.add_argument("-k", type=_positive_int, default=10, help="number of matches")
+    similar_parser.add_argument("--min-score", type=float, default=70)
+    similar_parser.add_argument("--snapshot", help="read listings from a snapshot directory instead of the DB")
+    photos_parser = subparsers.add_parser("photos", help="print listing pairs that share near-identical photos")
+    photos_parser.add_argument("--workers", type=_positive_int, default=8, help="concurrent image downloads")
+    photos_parser.add_argument("--cache-dir", default=".image_cache", help="local image cache")
+    photos_parser.add_argument("--max-distance", type=int, default=6, help="dHash bits two duplicates may differ in")
+    photos_parser.add_argument("--snapshot", help="read listings from a snapshot directory instead of the DB")
+    near_parser = subparsers.add_parser("near", help="listings within a radius of a point")
+    near_parser.add_argument("lat", type=float)
+    near_parser.add_argument("lon", type=float)
+    near_parser.add_argument("--radius", type=float, default=1.0, help="kilometres")
+    near_parser.add_argument("--limit", type=_positive_int, default=50)
+    district_parser = subparsers.add_parser("district", help="listings of a district and/or neighbourhood")
+    district_parser.add_argument("--district", type=int, help="منطقه number")
+    district_parser.add_argument("--neighborhood", help="محله name")
+    district_parser.add_argument("--limit", type=_positive_int, default=50)
+    subparsers.add_parser("parse-addresses", help="fill the district/neighbourhood/street columns of stored listings")
+    subparsers.add_parser("report", help="print the stored similar pairs")
+    clusters_parser = subparsers.add_parser("clusters", help="print the duplicate clusters")
+    clusters_parser.add_argument("--no-members", dest="members", action="store_false",
+                                 help="only print each cluster's representative")
+    subparsers.add_parser("menu", help="interactive menu")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    metrics.start_from_env()
+    if args.command in ("scrape", "schedule"):
+        ingest_dedup.enabled = args.dedup
+        ingest_dedup.warm()
+    try:
+        if args.command == "scrape" and args.source == "maskan":
+            maskan(once=args.once, max_items=args.max_items, workers=args.workers,
+                   batch_size=args.batch_size, interval=args.interval, backfill=args.backfill,
+                   clean_workers=args.clean_workers, persist_workers=args.persist_workers,
+                   queue_size=args.queue_size, fresh=args.fresh)
+        elif args.command == "scrape" and args.cities:
+            melkmun_cities(args.cities, once=args.once, max_items=args.max_items, workers=args.workers,
+                           batch_size=args.batch_size, interval=args.interval, shards=args.shards,
+                           date_from=args.date_from, date_to=args.date_to)
+        elif args.command == "scrape":
+            melkmun(once=args.once, max_items=args.max_items, workers=args.workers, batch_size=args.batch_size,
+                    interval=args.interval, backfill_items=args.backfill_items, poll_items=args.poll_items,
+                    fresh=args.fresh, shards=args.shards, date_from=args.date_from, date_to=args.date_to)
+        elif args.command == "schedule":
+            schedule(sources=args.sources, once=args.once, max_items=args.max_items, workers=args.workers,
+                     batch_size=args.batch_size, interval=args.interval, min_interval=args.min_interval,
+                     max_interval=args.max_interval, poll_items=args.poll_items,
+                     run_similarity=args.run_similarity, similarity_cooldown=args.similarity_cooldown)
+        elif args.command == "enqueue":
+            enqueue(args.source, backfill=args.backfill, items=args.items, page_size=args.page_size,
+                    cities=args.cities)
+            return 0
+        elif args.command == "worker":
+            start_workers(processes=args.processes, kinds=args.kinds, claim_size=args.claim_size,
+                          batch_size=args.batch_size, lease_seconds=args.lease, max_attempts=args.max_attempts,
+                          max_jobs=args.max_jobs, exit_when_idle=args.exit_when_idle, dedup=args.dedup)
+        elif args.command == "jobs":
+            print_jobs()
+            return 0
+        elif args.command == "similar":
+            print_similar_to(args.listing, k=args.k, min_score=args.min_score, snapshot_path=args.snapshot)
+            return 0
+        elif args.command == "photos":
+            print_shared_photos(snapshot_path=args.snapshot, workers=args.workers, cache_dir=args.cache_dir,
+                                max_distance=args.max_distance)
+            return 0
+        elif args.command == "similarity":
+            similarity(snapshot_path=args.snapshot, workers=args.workers, batch_size=args.batch_size,
+                       incremental=args.incremental, store_pairs=args.store_pairs, radius_km=args.radius,
+                       same_district=args.same_district)
+        elif args.command == "report":
+            print_similiar_files()
+            return 0
+        elif args.command == "near":
+            print_near(args.lat, args.lon, radius_km=args.radius, limit=args.limit)
+            return 0
+        elif args.command == "district":
+            print_district(args.district, args.neighborhood, args.limit)
+            return 0
+        elif args.command == "parse-addresses":
+            print(f"{backfill_address_fields()} addresses parsed")
+            return 0
+        elif args.command == "clusters":
+            print_clusters(members=args.members)
+            return 0
+        else:
+            menu()
+            return 0
+    except KeyboardInterrupt:
+        print("Interrupted.")
+        return 130
+    finally:
+        if args.command in ("scrape", "schedule", "similarity", "worker"):
+            print(metrics.summary())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
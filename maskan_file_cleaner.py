@@ -1,5 +1,8 @@
 import re
 from typing import Dict, Any, List, Optional, Union
+from address_parser import parse_address
+from listing import Listing
+from metrics import timed_stage
 
 class RealEstateCleaner:
     """
@@ -24,25 +27,28 @@ class RealEstateCleaner:
         # Pattern to extract room counts (supports both "3 خواب" and standalone numbers)
         self.room_pattern = re.compile(r'(\d+)\s*خواب|\b(\d+)\b')
 
-    def clean(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+    @timed_stage("clean")
+    def clean(self, raw_data: Union[Listing, Dict[str, Any]]) -> Union[Listing, Dict[str, Any]]:
         """
         Main cleaning method that processes raw scraped data into standardized format.
         
         Args:
-            raw_data: Raw dictionary containing scraped property data
+            raw_data: Raw Listing (or dictionary) containing scraped property data
             
         Returns:
-            Dict[str, Any]: Cleaned and standardized property data
+            Listing: Cleaned and standardized property data
             Returns empty dict if input is invalid
         """
         # Early return for empty/invalid input
         if not raw_data:
             return {}
 
-        cleaned_data = raw_data.copy()
+        cleaned_data = Listing.from_dict(raw_data)
         
         # Clean each data field with appropriate method
         cleaned_data['address'] = self._clean_address(raw_data.get('address', ''))
+        # District number, neighbourhood and street as separate fields
+        cleaned_data.update(parse_address(cleaned_data['address']))
         
         # Handle price fields differently based on rental/sale type
         self._clean_prices(cleaned_data, raw_data)
@@ -61,7 +67,7 @@ class RealEstateCleaner:
         
         return cleaned_data
 
-    def _clean_prices(self, cleaned_data: Dict[str, Any], raw_data: Dict[str, Any]) -> None:
+    def _clean_prices(self, cleaned_data: Listing, raw_data: Dict[str, Any]) -> None:
         """
         Cleans and standardizes price-related fields based on listing type (rental/sale).
         
@@ -1,9 +1,10 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from bs4 import BeautifulSoup
 import time
 import re
+from metrics import timed, count
+from browser import make_chrome, page_report
+from rate_governor import GOVERNOR
 
 class Maskan_File:
     def __init__(self, url):
@@ -11,10 +12,14 @@ class Maskan_File:
         self.seen_links = set()
         
     def start_driver(self):
-        self.driver = webdriver.Chrome(service=Service())
+        # Images, fonts and trackers are blocked; styles stay so "load more" remains clickable
+        self.driver = make_chrome("maskan-file-listing", headless=False)
+        GOVERNOR.acquire(self.url)
         self.driver.get(self.url)
         time.sleep(4)
+        self.last_report = page_report(self.driver, self.url)
         self.html = self.driver.page_source
+        GOVERNOR.report(self.url, self.last_report.status, self.html, redirected=self.last_report.redirected)
         self.soup = BeautifulSoup(self.html, "html.parser")
 
     def extract_links(self):
@@ -38,11 +43,14 @@ class Maskan_File:
             self.driver.quit()   
     
     def run(self):
-        try:
-            self.start_driver()
-            return self.extract_links()
-        finally:
-            self.quit_driver()
+        with timed("discovery"):
+            try:
+                self.start_driver()
+                links = self.extract_links()
+            finally:
+                self.quit_driver()
+        count("discovered", len(links))
+        return links
 
 if __name__ == "__main__":
     detector = Maskan_File("https://maskan-file.ir/Site/Default.aspx")
@@ -1,63 +1,110 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 import time
 import re
+from metrics import timed, count
+from browser import make_chrome, page_report
+from rate_governor import GOVERNOR
+
+# Returns [total card count, onclick attributes of the cards from index arguments[0] on],
+# so each "load more" round only ships the newly appended cards out of the browser
+NEW_CARDS_SCRIPT = """
+var cards = document.querySelectorAll('div.btn-showdetail');
+var onclicks = [];
+for (var i = arguments[0]; i < cards.length; i++) {
+    onclicks.push(cards[i].getAttribute('onclick') || '');
+}
+return [cards.length, onclicks];
+"""
 
 class Maskan_File:
-    def __init__(self, url):
+    def __init__(self, url, filter_new=None, known_pages_to_stop=1, page_timeout=10, start_page=1):
+        """
+        :param filter_new: optional callable taking a list of links and returning the ones
+                           not stored yet; when given, only those are returned
+        :param known_pages_to_stop: stop clicking "load more" after this many consecutive
+                                    pages without a single new listing
+        :param page_timeout: seconds to wait for the next page of cards to be appended
+        :param start_page: first page whose links are returned; earlier pages are only clicked through
+        """
         self.url = url
+        self.filter_new = filter_new
+        self.known_pages_to_stop = known_pages_to_stop
+        self.page_timeout = page_timeout
+        self.start_page = start_page
         self.seen_links = set()
+        self.card_index = 0
 
     def start_driver(self):
-        self.driver = webdriver.Chrome(service=Service())
+        # Images, fonts and trackers are blocked; styles stay so "load more" remains clickable
+        self.driver = make_chrome("maskan-file-listing", headless=False)
+        GOVERNOR.acquire(self.url)
         self.driver.get(self.url)
         time.sleep(4)
-    
-    def extract_links(self, soup):
-        links = soup.find_all("div", class_="btn-showdetail")
+        self.last_report = page_report(self.driver, self.url)
+
+    def extract_new_links(self):
+        # Only the cards appended since the last call are read and transferred
+        total, onclicks = self.driver.execute_script(NEW_CARDS_SCRIPT, self.card_index)
+        self.card_index = total
         link_list = []
 
-        for div in links:
-            onclick = div.get("onclick", "")
-            if onclick:
-                match = re.search(r"window\.open\('([^']+)'\)", onclick)
-                if match:
-                    full_link = match.group(1)
-                    if full_link not in self.seen_links:
-                        link_list.append(full_link)
-                        self.seen_links.add(full_link)
-                    
+        for onclick in onclicks:
+            match = re.search(r"window\.open\('([^']+)'\)", onclick)
+            if match:
+                full_link = match.group(1)
+                if full_link not in self.seen_links:
+                    link_list.append(full_link)
+                    self.seen_links.add(full_link)
+
         return link_list
-        
+
     def click_next(self):
         try:
             next_button = self.driver.find_element(By.LINK_TEXT, "مشاهده موارد بیشتر")
+            # Every "load more" is a postback to the site, paced like any other request
+            GOVERNOR.acquire(self.url)
             next_button.click()
-            return True
         except:
             return False
-        
+        try:
+            # Wait until the next page of cards has actually been appended
+            WebDriverWait(self.driver, self.page_timeout).until(
+                lambda driver: driver.execute_script(
+                    "return document.querySelectorAll('div.btn-showdetail').length;") > self.card_index)
+            return True
+        except TimeoutException:
+            return False
+
     def run(self):
-        trylisten = True
         all_links = []
-        try:
-            self.start_driver()
-            while True:
-                time.sleep(1)
-                html = self.driver.page_source
-                soup = BeautifulSoup(html, "html.parser")
-                links = self.extract_links(soup)
-                all_links.extend(links)
-                if not self.click_next():
-                    break
-        finally:
-            self.driver.quit()
-        
+        known_pages = 0
+        page = 0
+        with timed("discovery"):
+            try:
+                self.start_driver()
+                while True:
+                    links = self.extract_new_links()
+                    page += 1
+                    if page < self.start_page:
+                        # Already collected by the caller, e.g. before HTTP discovery failed
+                        if not self.click_next():
+                            break
+                        continue
+                    if self.filter_new is not None:
+                        links = self.filter_new(links)
+                        # Pages are newest first: once whole pages are already stored, the rest is too
+                        known_pages = 0 if links else known_pages + 1
+                    all_links.extend(links)
+                    if known_pages >= self.known_pages_to_stop or not self.click_next():
+                        break
+            finally:
+                self.driver.quit()
+        count("discovered", len(all_links))
         return all_links
-            
+
 if __name__ == "__main__":
     scraper = Maskan_File("https://maskan-file.ir/Site/Default.aspx")
     links = scraper.run()
-    print(links)
\ No newline at end of file
+    print(links)
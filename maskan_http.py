@@ -0,0 +1,194 @@
+import html
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+from http_session import shared_session
+from metrics import timed, count
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/124.0 Safari/537.36",
+    "Accept-Language": "fa-IR,fa;q=0.9,en;q=0.8",
+}
+
+MORE_TEXT = "مشاهده موارد بیشتر"
+
+# Lightweight extraction: no DOM, just the tags and attributes we need
+_CARD_TAG_RE = re.compile(r"<div\b[^>]*\bbtn-showdetail\b[^>]*>", re.I)
+_WINDOW_OPEN_RE = re.compile(r"window\.open\('([^']+)'\)")
+_HIDDEN_INPUT_RE = re.compile(r"<input\b[^>]*type=[\"']hidden[\"'][^>]*>", re.I)
+_ATTR_RE = re.compile(r"""\b(name|value|id)=(?:"([^"]*)"|'([^']*)')""", re.I)
+_MORE_LINK_RE = re.compile(r"<a\b([^>]*)>\s*" + MORE_TEXT + r"\s*</a>")
+_POSTBACK_RE = re.compile(r"__doPostBack\(\s*'([^']*)'\s*,\s*'([^']*)'\s*\)")
+_SCRIPT_MANAGER_RE = re.compile(r"PageRequestManager\._initialize\('([^']+)'")
+_UPDATE_PANEL_RE = re.compile(r"PageRequestManager\._initialize\('[^']+',\s*'[^']*',\s*\[([^\]]*)\]")
+
+
+def extract_links(page: str) -> List[str]:
+    """Return the window.open targets of the btn-showdetail cards, in page order"""
+    links = []
+    for tag in _CARD_TAG_RE.findall(page):
+        match = _WINDOW_OPEN_RE.search(html.unescape(tag))
+        if match:
+            links.append(match.group(1))
+    return links
+
+
+def _attrs(tag: str) -> Dict[str, str]:
+    return {name.lower(): html.unescape(double if double is not None else single)
+            for name, double, single in _ATTR_RE.findall(tag)}
+
+
+def extract_form_state(page: str) -> Dict[str, str]:
+    """Collect the hidden WebForms fields (__VIEWSTATE, __EVENTVALIDATION, ...) a postback must echo"""
+    state = {}
+    for tag in _HIDDEN_INPUT_RE.findall(page):
+        attrs = _attrs(tag)
+        if attrs.get("name"):
+            state[attrs["name"]] = attrs.get("value", "")
+    return state
+
+
+def find_more_postback(page: str) -> Optional[Tuple[str, str]]:
+    """(event target, event argument) of the "load more" link, or None on the last page"""
+    match = _MORE_LINK_RE.search(page)
+    if not match:
+        return None
+    postback = _POSTBACK_RE.search(html.unescape(match.group(1)))
+    return (postback.group(1), postback.group(2)) if postback else None
+
+
+def parse_delta(body: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Parse an ASP.NET AJAX partial-postback response (length|type|id|content| records)
+    into the concatenated updatePanel HTML and the refreshed hidden fields.
+    """
+    panels, hidden, pos = [], {}, 0
+    while pos < len(body):
+        length_end = body.index("|", pos)
+        length = int(body[pos:length_end])
+        type_end = body.index("|", length_end + 1)
+        record_type = body[length_end + 1:type_end]
+        id_end = body.index("|", type_end + 1)
+        record_id = body[type_end + 1:id_end]
+        content = body[id_end + 1:id_end + 1 + length]
+        pos = id_end + 1 + length + 1
+        if record_type == "updatePanel":
+            panels.append(content)
+        elif record_type == "hiddenField":
+            hidden[record_id] = content
+    return "".join(panels), hidden
+
+
+class MaskanHttpDiscovery:
+    """
+    Discovers maskan-file listing links over plain HTTP instead of rendering
+    Default.aspx in Chrome. Paging replays the "load more" WebForms postback,
+    as a partial (AJAX) postback when the page has a ScriptManager.
+    """
+
+    def __init__(self, url: str, session: Optional[requests.Session] = None, max_pages: Optional[int] = 1,
+                 filter_new: Optional[Callable[[List[str]], List[str]]] = None, timeout: float = 15):
+        self.url = url
+        self.session = session or shared_session("maskan-file", headers=HEADERS)
+        self.max_pages = max_pages
+        self.filter_new = filter_new
+        self.timeout = timeout
+        self.seen_links = set()
+        self.cards_found = 0
+        # What run() got through, kept when a later page fails
+        self.links = []
+        self.pages = 0
+
+    def _new_links(self, page: str) -> List[str]:
+        links = []
+        found = extract_links(page)
+        self.cards_found += len(found)
+        for link in found:
+            link = urljoin(self.url, link)
+            if link not in self.seen_links:
+                self.seen_links.add(link)
+                links.append(link)
+        return links
+
+    def _postback(self, page: str, state: Dict[str, str], target: str, argument: str) -> Tuple[str, Dict[str, str]]:
+        form = dict(state)
+        form["__EVENTTARGET"] = target
+        form["__EVENTARGUMENT"] = argument
+        script_manager = _SCRIPT_MANAGER_RE.search(page)
+        headers = {"Referer": self.url}
+        if script_manager:
+            panels = _UPDATE_PANEL_RE.search(page)
+            panel = panels.group(1).split(",")[0].strip().strip("'\"") if panels else ""
+            # Panel ids are prefixed with t/f (children as triggers or not)
+            panel = panel[1:] if panel[:1] in ("t", "f") else panel
+            form[script_manager.group(1)] = f"{panel}|{target}" if panel else target
+            form["__ASYNCPOST"] = "true"
+            headers.update({"X-MicrosoftAjax": "Delta=true", "X-Requested-With": "XMLHttpRequest"})
+
+        response = self.session.post(self.url, data=form, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.text
+        if script_manager and "|updatePanel|" in body:
+            fragment, hidden = parse_delta(body)
+            return fragment, {**state, **hidden}
+        return body, extract_form_state(body)
+
+    def run(self) -> List[str]:
+        all_links = self.links
+        with timed("discovery"):
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            page = full_page = response.text
+            state = extract_form_state(page)
+            while True:
+                links = self._new_links(page)
+                if not links:
+                    # The postback appended nothing we have not seen: end of the list
+                    break
+                if self.filter_new is not None:
+                    links = self.filter_new(links)
+                all_links.extend(links)
+                self.pages += 1
+                if self.max_pages is not None and self.pages >= self.max_pages:
+                    break
+                if self.filter_new is not None and not links:
+                    # Pages are newest first: a page of stored listings means we caught up
+                    break
+                # The "load more" link lives in the latest fragment, or in the full page on AJAX sites
+                postback = find_more_postback(page) or find_more_postback(full_page)
+                if not postback:
+                    break
+                page, state = self._postback(full_page, state, *postback)
+        count("discovered", len(all_links))
+        return all_links
+
+
+def discover_links(url: str, fallback, max_pages: Optional[int] = 1, filter_new=None,
+                   session: Optional[requests.Session] = None) -> List[str]:
+    """
+    Discover listing links over HTTP, falling back to the Selenium detector built by
+    fallback(start_page) when the HTTP path fails or the page has no cards (e.g. after a redesign).
+    Links from the pages HTTP got through are kept and the fallback resumes at the page that failed.
+    """
+    discovery = MaskanHttpDiscovery(url, session=session, max_pages=max_pages, filter_new=filter_new)
+    try:
+        links = discovery.run()
+        if discovery.cards_found:
+            return links
+        logging.warning("HTTP discovery found no listing cards, falling back to Selenium")
+    except (requests.RequestException, ValueError) as e:
+        logging.warning(f"HTTP discovery failed after {discovery.pages} page(s), falling back to Selenium: {e}")
+    count("discovery_fallback")
+    links = list(discovery.links)
+    # The detector replays the earlier pages to reach start_page; anything already kept is skipped
+    known = set(links)
+    for link in fallback(discovery.pages + 1).run():
+        if urljoin(url, link) not in known:
+            known.add(urljoin(url, link))
+            links.append(link)
+    return links
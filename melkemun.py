@@ -1,4 +1,8 @@
-import requests
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from http_session import shared_session
+from metrics import count, timed_stage
 
 class Estate:
     """
@@ -81,40 +85,119 @@ class EstateFetcher:
     }
 
     def __init__(self, city_id=2, date_from="2024-05-19T00:00:00.000Z",
-                 date_to="2025-05-15T23:59:59.000Z"):
+                 date_to="2025-05-15T23:59:59.000Z", session=None):
         """
         Initialize the fetcher with optional filters for city and date range.
+        All fetchers share one pooled, retrying session unless another is given.
         """
         self.city_id = city_id
         self.date_from = date_from
         self.date_to = date_to
+        self.session = session or shared_session("melkemun", headers=self.HEADERS)
 
-    def fetch(self, limit=20, offset=0):
+    @timed_stage("fetch")
+    def fetch(self, limit=20, offset=0, date_from=None, date_to=None, ordering="-published_at"):
         """
         Fetch a list of estate records from the API with pagination.
+        date_from/date_to narrow the fetcher's window for this call only.
         """
         params = {
-            "ordering": "-published_at",
+            "ordering": ordering,
             "limit": limit,
             "offset": offset,
             "loc_city_id": self.city_id,
-            "published_at__gte": self.date_from,
-            "published_at__lte": self.date_to,
+            "published_at__gte": date_from or self.date_from,
+            "published_at__lte": date_to or self.date_to,
         }
-        response = requests.get(self.BASE_URL, headers=self.HEADERS, params=params)
+        response = self.session.get(self.BASE_URL, params=params)
         if response.status_code == 200:
             return response.json().get("results", [])
         else:
             raise Exception(f"Error fetching data: {response.status_code}")
 
 
+def parse_api_date(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+
+
+def format_api_date(value):
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+class ShardedBackfill:
+    """
+    Downloads every listing of the fetcher's published_at window by splitting it
+    into date shards that are fetched concurrently, instead of paging the whole
+    range by ever deeper offsets.
+
+    A shard whose first page comes back full probably holds more listings, so it
+    is split in half and both halves are queued; once a shard is no longer than
+    min_span it is paged by offset instead. The shards share the fetcher's session,
+    so the per-host rate governor caps the combined request rate.
+    """
+
+    def __init__(self, fetcher, shards=8, workers=4, page_size=100, min_span=timedelta(hours=1)):
+        self.fetcher = fetcher
+        self.shards = max(1, shards)
+        self.workers = max(1, workers)
+        self.page_size = page_size
+        self.min_span = min_span
+        self.seen_ids = set()
+
+    def initial_shards(self):
+        start, end = parse_api_date(self.fetcher.date_from), parse_api_date(self.fetcher.date_to)
+        step = (end - start) / self.shards
+        return [(start + step * i, end if i == self.shards - 1 else start + step * (i + 1))
+                for i in range(self.shards)]
+
+    def _fetch_shard(self, window, offset=0):
+        start, end = window
+        return self.fetcher.fetch(limit=self.page_size, offset=offset,
+                                  date_from=format_api_date(start), date_to=format_api_date(end))
+
+    def _next_tasks(self, window, offset, records):
+        """Follow-up work for a shard whose page came back full"""
+        if len(records) < self.page_size:
+            return []
+        start, end = window
+        if offset == 0 and end - start > self.min_span:
+            middle = start + (end - start) / 2
+            count("melkemun_shard_split")
+            return [((start, middle), 0), ((middle, end), 0)]
+        return [(window, offset + self.page_size)]
+
+    def run(self):
+        """Yield each raw record of the window once (deduplicated by id), in completion order"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._fetch_shard, window): (window, 0) for window in self.initial_shards()}
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    window, offset = pending.pop(future)
+                    try:
+                        records = future.result()
+                    except Exception as e:
+                        logging.error(f"Shard {format_api_date(window[0])}..{format_api_date(window[1])} "
+                                      f"offset {offset} failed: {e}")
+                        continue
+                    for next_window, next_offset in self._next_tasks(window, offset, records):
+                        pending[executor.submit(self._fetch_shard, next_window, next_offset)] = (next_window, next_offset)
+                    for record in records:
+                        # Shard boundaries are inclusive on both sides and split pages overlap their halves
+                        if record.get("id") in self.seen_ids:
+                            count("melkemun_shard_duplicate")
+                            continue
+                        self.seen_ids.add(record.get("id"))
+                        yield record
+
+
 class EstateManager:
     """
     Main interface for working with estate data in an OOP style.
     """
 
-    def __init__(self):
-        self.fetcher = EstateFetcher()
+    def __init__(self, city_id=2):
+        self.fetcher = EstateFetcher(city_id=city_id)
 
     def get_estate_by_index(self, n):
         """
@@ -130,6 +213,72 @@ class EstateManager:
         return estate.to_dict()
 
 
+class MultiCityIngestor:
+    """
+    Polls several cities (loc_city_id) concurrently from one process. All cities
+    share the pooled melkemun session and therefore one per-host rate budget.
+
+    Each city keeps a watermark: the published_at of the newest listing taken
+    from it, moved by advance() once the caller has taken what a poll returned.
+    A city with a watermark is read oldest first from that point on, so a poll
+    capped at max_pages never leaves a gap; a city without one starts from its
+    newest page. Persist watermarks only after those listings are stored.
+    """
+
+    def __init__(self, city_ids, workers=4, page_size=20, max_pages=10, watermarks=None):
+        """
+        :param watermarks: city id -> published_at, e.g. restored from a checkpoint
+        """
+        self.fetchers = {city_id: EstateFetcher(city_id=city_id) for city_id in city_ids}
+        self.workers = max(1, workers)
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.watermarks = {str(city): value for city, value in (watermarks or {}).items()}
+
+    def poll_city(self, city_id):
+        """Raw records of one city published since its watermark, oldest first"""
+        fetcher = self.fetchers[city_id]
+        watermark = self.watermarks.get(str(city_id))
+        now = format_api_date(datetime.now(timezone.utc))
+        if watermark is None:
+            records = fetcher.fetch(limit=self.page_size, date_from=fetcher.date_from, date_to=now)
+            records.reverse()
+        else:
+            records = []
+            for page in range(self.max_pages):
+                batch = fetcher.fetch(limit=self.page_size, offset=page * self.page_size, date_from=watermark,
+                                      date_to=now, ordering="published_at")
+                records.extend(batch)
+                if len(batch) < self.page_size:
+                    break
+            else:
+                logging.info(f"City {city_id} has more new listings than {self.max_pages} pages, "
+                             f"continuing next poll")
+        count("melkemun_city_records", len(records))
+        return records
+
+    def advance(self, city_id, records):
+        """Move a city's watermark past records (oldest first) once they are taken care of"""
+        if records and records[-1].get("published_at"):
+            self.watermarks[str(city_id)] = records[-1]["published_at"]
+
+    def poll(self):
+        """Yield (city id, raw records) for every city as soon as its poll completes"""
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(self.fetchers))) as executor:
+            futures = {executor.submit(self.poll_city, city_id): city_id for city_id in self.fetchers}
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    city_id = futures.pop(future)
+                    try:
+                        records = future.result()
+                    except Exception as e:
+                        # One failing city must not hold back the others; its watermark stays put
+                        logging.error(f"Polling city {city_id} failed: {e}")
+                        continue
+                    yield city_id, records
+
+
 # Script entry point
 if __name__ == "__main__":
     try:
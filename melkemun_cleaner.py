@@ -1,6 +1,9 @@
 import re
 from typing import Dict, List, Optional
 from datetime import datetime
+from address_parser import normalize_neighborhood, parse_address
+from listing import Listing
+from metrics import timed_stage
 
 class MelkemunEstateCleaner:
     """
@@ -52,11 +55,12 @@ class MelkemunEstateCleaner:
         self.type_id = self.raw_data.get("type_id")
         self.is_rental = self.status_id in {1, 2, 6}
 
-    def clean(self) -> Dict:
+    @timed_stage("clean")
+    def clean(self) -> Listing:
         """
         Perform all cleaning and standardization of the data
         
-        :return: A dictionary containing the cleaned and standardized data
+        :return: A Listing of the cleaned and standardized data (empty dict on error)
         """
         try:
             cleaned_data = {
@@ -64,6 +68,7 @@ class MelkemunEstateCleaner:
                 "file_code": self._clean_id(),
                 "title": self._generate_title(),
                 "address": self._clean_address(),
+                **self._parse_address(),
                 "total_price": self._clean_price("price"),
                 "price_per_meter": self._clean_price("price_per_meter"),
                 "mortgage": self._clean_mortgage(),
@@ -76,6 +81,8 @@ class MelkemunEstateCleaner:
                 "is_rental": self.is_rental,
                 "transaction_type": self.STATUS_MAPPING.get(self.status_id, "نامشخص"),
                 "property_type": self.TYPE_MAPPING.get(self.type_id, "نامشخص"),
+                "latitude": self._clean_coordinate("loc_latitude"),
+                "longitude": self._clean_coordinate("loc_longitude"),
                 "location": self._extract_location(),
                 "seller_info": self._extract_seller_info(),
                 "description": self._clean_description(),
@@ -83,8 +90,8 @@ class MelkemunEstateCleaner:
                 "metadata": self._extract_metadata()
             }
             
-            # Remove empty fields
-            return {k: v for k, v in cleaned_data.items() if v not in [None, "", [], {}]}
+            # Remove empty fields; only the Listing fields are kept
+            return Listing.from_dict({k: v for k, v in cleaned_data.items() if v not in [None, "", [], {}]})
             
         except Exception as e:
             print(f"Error cleaning data: {str(e)}")
@@ -240,6 +247,21 @@ class MelkemunEstateCleaner:
             "map_link": f"https://maps.google.com/?q={lat},{lon}" if lat and lon else ""
         }
 
+    def _parse_address(self) -> Dict:
+        """District, neighbourhood and street in the same fields as maskan-file listings"""
+        parsed = parse_address(self.raw_data.get("loc_address", ""))
+        neighborhood = normalize_neighborhood(self.raw_data.get("loc_neighborhood_name"))
+        if neighborhood:
+            parsed["neighborhood"] = neighborhood
+        return parsed
+
+    def _clean_coordinate(self, field: str) -> Optional[float]:
+        """Typed latitude or longitude; the location dict keeps the raw strings"""
+        try:
+            return float(self.raw_data.get(field))
+        except (TypeError, ValueError):
+            return None
+
     def _extract_seller_info(self) -> Dict:
         """Extract seller information"""
         return {
@@ -1,5 +1,5 @@
-import requests
-import time
+from http_session import shared_session
+from metrics import timed_stage
 
 class Estate:
     def __init__(self, data):
@@ -44,6 +44,7 @@ class EstateFetcher:
         self.city_id = city_id
         self.date_from = date_from
         self.date_to = date_to
+        self.session = shared_session("melkemun", headers=self.HEADERS)
 
     def fetch_all_estates(self):
         all_estates = []
@@ -51,9 +52,9 @@ class EstateFetcher:
             estates = self._fetch(offset)
             print(f"Got {len(estates)} items from offset {offset}")
             all_estates.extend(Estate(item) for item in estates)
-            time.sleep(1)
         return all_estates
 
+    @timed_stage("fetch")
     def _fetch(self, offset):
         params = {
             "ordering": "-published_at",
@@ -63,7 +64,7 @@ class EstateFetcher:
             "published_at__gte": self.date_from,
             "published_at__lte": self.date_to,
         }
-        response = requests.get(self.BASE_URL, headers=self.HEADERS, params=params)
+        response = self.session.get(self.BASE_URL, params=params)
         if response.status_code == 200:
             return response.json().get("results", [])
         else:
@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# Latency buckets in seconds, from a fast DB insert up to a slow headless Chrome page
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+    def to_dict(self):
+        return {_format_labels(key) or "total": value for key, value in self._values.items()}
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets, optionally split by labels"""
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., +Inf count], sum
+        self._counts: Dict[tuple, list] = {}
+        self._sums: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(_label_key(labels), ()))
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for key in sorted(self._counts):
+            counts, cumulative = self._counts[key], 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {cumulative}"
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {self._sums[key]}"
+            yield f"{self.name}_count{_format_labels(key)} {cumulative}"
+
+    def to_dict(self):
+        result = {}
+        for key, counts in self._counts.items():
+            total = sum(counts)
+            result[_format_labels(key) or "total"] = {
+                "count": total,
+                "sum": self._sums[key],
+                "mean": self._sums[key] / total if total else 0.0,
+            }
+        return result
+
+
+class Gauge:
+    """A value that goes up and down; either set directly or read from a callback at export time"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, func, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = func
+
+    def remove(self, **labels) -> None:
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+    def value(self, **labels) -> float:
+        value = self._values.get(_label_key(labels), 0)
+        return value() if callable(value) else value
+
+    def _items(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(key, value() if callable(value) else value) for key, value in items]
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        for key, value in sorted(self._items()):
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+    def to_dict(self):
+        return {_format_labels(key) or "total": value for key, value in self._items()}
+
+
+class Registry:
+    """Holds every metric of the process and renders them for export"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, *args)
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        return {name: metric.to_dict() for name, metric in list(self._metrics.items())}
+
+
+REGISTRY = Registry()
+
+# Pipeline-wide metrics shared by the scrapers, cleaners, DB layer and similarity engine
+STAGE_SECONDS = REGISTRY.histogram("codescraper_stage_seconds", "Time spent per pipeline stage call")
+ITEMS = REGISTRY.counter("codescraper_items_total", "Items processed per pipeline event")
+ERRORS = REGISTRY.counter("codescraper_errors_total", "Failures per pipeline stage")
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of the enclosed block under the given stage, counting failures too"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed_stage(stage: str):
+    """Decorator version of timed()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(event: str, amount: float = 1) -> None:
+    ITEMS.inc(amount, event=event)
+
+
+def summary(registry: Registry = REGISTRY) -> str:
+    """Short human readable digest of the item counters and stage timings"""
+    lines = []
+    for name, metric in sorted(registry._metrics.items()):
+        if isinstance(metric, Gauge):
+            continue
+        if isinstance(metric, Counter):
+            for key, value in sorted(metric._values.items()):
+                label = ",".join(f"{v}" for _, v in key) or name
+                lines.append(f"{name.replace('codescraper_', '')}[{label}]: {value:g}")
+        else:
+            for key, values in sorted(metric.to_dict().items()):
+                lines.append(f"{name.replace('codescraper_', '')}{key}: {values['count']} calls, "
+                             f"{values['sum']:.2f}s total, {values['mean'] * 1000:.1f}ms mean")
+    return "\n".join(lines) if lines else "nothing recorded"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise flood stderr
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve the registry in Prometheus text format on /metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class JsonDumper:
+    """Periodically writes the registry as JSON to a file (atomically replaced)"""
+
+    def __init__(self, path: str, interval: float = 60, registry: Registry = REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-json", daemon=True)
+
+    def start(self) -> "JsonDumper":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.dump()
+
+    def dump(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "metrics": self.registry.to_dict()}, f)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+
+def start_from_env():
+    """
+    Start the exporters configured through the environment:
+    CODESCRAPER_METRICS_PORT for the HTTP endpoint, CODESCRAPER_METRICS_JSON
+    (and optionally CODESCRAPER_METRICS_INTERVAL) for the periodic JSON dump.
+    """
+    port = os.environ.get("CODESCRAPER_METRICS_PORT")
+    if port:
+        start_http_server(int(port))
+    json_path = os.environ.get("CODESCRAPER_METRICS_JSON")
+    if json_path:
+        JsonDumper(json_path, float(os.environ.get("CODESCRAPER_METRICS_INTERVAL", 60))).start()
@@ -0,0 +1,160 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from metrics import REGISTRY, ERRORS
+
+QUEUE_DEPTH = REGISTRY.gauge("codescraper_queue_depth", "Items waiting in front of each pipeline stage")
+STAGE_ITEMS = REGISTRY.counter("codescraper_stage_items_total", "Items completed by each pipeline stage")
+STAGE_BUSY = REGISTRY.counter("codescraper_stage_busy_seconds_total", "Time stage workers spent processing items")
+
+# Marks the end of the stream; every worker forwards it once it drains its queue
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline: workers threads take items from a bounded input
+    queue, call func on each and pass non-None results downstream.
+
+    A full input queue blocks the upstream stage (backpressure), so a fast
+    stage can never run more than queue_size items ahead of a slow one.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1, queue_size: int = 100):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+        self._finished_workers = 0
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "throughput": self.processed / elapsed if elapsed > 0 else 0.0,
+            # Share of worker time spent busy; the stage closest to 1.0 is the bottleneck
+            "utilization": self.busy_seconds / (self.workers * elapsed) if elapsed > 0 else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    Connects a source iterable to a chain of stages with bounded queues in between.
+
+    The source runs in its own thread, each stage in its own pool of worker
+    threads, so discovery, fetching, cleaning and persisting overlap instead of
+    waiting for one another. Queue depths and per-stage throughput are exported
+    through metrics and can be logged every report_interval seconds.
+    """
+
+    def __init__(self, source: Iterable[Any], stages: List[Stage], report_interval: Optional[float] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.source = source
+        self.stages = stages
+        self.report_interval = report_interval
+        self.produced = 0
+        self._started_at = None
+        self._done = threading.Event()
+
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        """Run until the source is exhausted and every stage has drained; return the final stats"""
+        self._started_at = time.perf_counter()
+        for stage in self.stages:
+            QUEUE_DEPTH.set_function(stage.queue.qsize, stage=stage.name)
+
+        threads = [threading.Thread(target=self._produce, name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, downstream),
+                                                name=f"pipeline-{stage.name}-{n}", daemon=True))
+        if self.report_interval:
+            threading.Thread(target=self._report, name="pipeline-report", daemon=True).start()
+
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            self._done.set()
+            for stage in self.stages:
+                QUEUE_DEPTH.remove(stage=stage.name)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
+
+    def bottleneck(self) -> Optional[str]:
+        stats = self.stats()
+        if not stats:
+            return None
+        return max(stats, key=lambda name: stats[name]["utilization"])
+
+    def _produce(self):
+        first = self.stages[0]
+        try:
+            for item in self.source:
+                first.queue.put(item)
+                self.produced += 1
+        except Exception as e:
+            ERRORS.inc(stage="source")
+            logging.error(f"Pipeline source failed: {e}")
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_STOP)
+
+    def _work(self, stage: Stage, downstream: Optional[Stage]):
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+            start = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                result = None
+                with stage._lock:
+                    stage.errors += 1
+                ERRORS.inc(stage=stage.name)
+                logging.error(f"Stage {stage.name} failed on {item!r:.80}: {e}")
+            busy = time.perf_counter() - start
+
+            with stage._lock:
+                stage.busy_seconds += busy
+                if result is None:
+                    stage.dropped += 1
+                else:
+                    stage.processed += 1
+            STAGE_BUSY.inc(busy, stage=stage.name)
+            if result is not None:
+                STAGE_ITEMS.inc(stage=stage.name)
+                if downstream is not None:
+                    downstream.queue.put(result)
+
+        # The last worker of a stage to finish closes the next stage
+        with stage._lock:
+            stage._finished_workers += 1
+            last = stage._finished_workers == stage.workers
+        if last and downstream is not None:
+            for _ in range(downstream.workers):
+                downstream.queue.put(_STOP)
+
+    def _report(self):
+        while not self._done.wait(self.report_interval):
+            parts = [f"{name}: q={s['queue_depth']} done={s['processed']} {s['throughput']:.2f}/s "
+                     f"util={s['utilization']:.0%}" for name, s in self.stats().items()]
+            logging.info("Pipeline " + " | ".join(parts) + f" | bottleneck: {self.bottleneck()}")
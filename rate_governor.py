@@ -0,0 +1,155 @@
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from metrics import REGISTRY
+
+HOST_RATE = REGISTRY.gauge("codescraper_host_rate", "Current allowed requests per second per host")
+THROTTLE_EVENTS = REGISTRY.counter("codescraper_throttle_events_total", "Throttling signals seen per host and kind")
+GOVERNOR_WAIT = REGISTRY.histogram("codescraper_governor_wait_seconds", "Time spent waiting for a request token per host")
+
+# Markers only challenge pages carry: the Cloudflare interstitial ("Just a moment...",
+# cf-chl-* tokens, the challenge-platform script) and challenge forms, e.g. a reCAPTCHA
+# served as the page itself. A page that merely embeds a reCAPTCHA widget matches none.
+_CHALLENGE_RE = re.compile(
+    r"cf-chl-|/cdn-cgi/challenge-platform/|<title>\s*(?:just a moment|attention required)"
+    r"|<form[^>]+(?:id|class)=[\"'][^\"']*(?:challenge-form|captcha-form)"
+    r"|<form[^>]+action=[\"'][^\"']*(?:captcha|challenge)", re.I)
+
+# Statuses a challenge page is served with
+CHALLENGE_STATUSES = (403, 429, 503)
+
+
+def looks_like_captcha(text: Optional[str], status: Optional[int] = None, redirected: bool = False) -> bool:
+    """
+    Whether a response is a challenge page served instead of the content: a challenge
+    marker on a 403/429/503 response or on a page reached through a redirect.
+    """
+    if not text or not (status in CHALLENGE_STATUSES or redirected):
+        return False
+    # Challenge pages put their markers near the top, no need to scan a whole listing page
+    return bool(_CHALLENGE_RE.search(text[:20000]))
+
+
+class TokenBucket:
+    """
+    Classic token bucket: tokens refill at rate per second up to burst, and each
+    request takes one. The rate is adjusted AIMD-style by the governor.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float, max_rate: float):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # No growth until this moment, so one throttle is not undone by in-flight successes
+        self.hold_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def increase(self, step: float) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.hold_until:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + step)
+
+    def decrease(self, factor: float, hold: float) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * factor)
+            # Drain the burst so the lower rate takes effect immediately
+            self.tokens = min(self.tokens, 0)
+            self.hold_until = now + hold
+
+
+class RateGovernor:
+    """
+    Central politeness control: one token bucket per host, shared by every fetcher
+    in the process. Healthy responses raise a host's rate additively, throttling
+    signals (429/503, timeouts, CAPTCHA pages) cut it multiplicatively.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: float = 2, min_rate: float = 0.05, max_rate: float = 10,
+                 increase_step: float = 0.05, decrease_factor: float = 0.5, hold_seconds: float = 30,
+                 host_limits: Optional[Dict[str, Dict[str, float]]] = None):
+        """
+        :param rate: starting requests per second for a host
+        :param host_limits: per-host overrides of rate, burst, min_rate and max_rate
+        """
+        self.defaults = {"rate": rate, "burst": burst, "min_rate": min_rate, "max_rate": max_rate}
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.hold_seconds = hold_seconds
+        self.host_limits = host_limits or {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url_or_host: str) -> TokenBucket:
+        host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                settings = {**self.defaults, **self.host_limits.get(host, {})}
+                bucket = self._buckets[host] = TokenBucket(**settings)
+                HOST_RATE.set_function(lambda: bucket.rate, host=host)
+            return bucket
+
+    def acquire(self, url: str) -> float:
+        """Block until a request to url's host is allowed; returns the time waited"""
+        host = urlsplit(url).hostname or url
+        delay = self.bucket(host).reserve()
+        if delay > 0:
+            time.sleep(delay)
+        GOVERNOR_WAIT.observe(delay, host=host)
+        return delay
+
+    def success(self, url: str) -> None:
+        self.bucket(urlsplit(url).hostname or url).increase(self.increase_step)
+
+    def throttled(self, url: str, kind: str) -> None:
+        host = urlsplit(url).hostname or url
+        bucket = self.bucket(host)
+        bucket.decrease(self.decrease_factor, self.hold_seconds)
+        THROTTLE_EVENTS.inc(host=host, kind=kind)
+        logging.warning(f"{host} throttled ({kind}), rate cut to {bucket.rate:.2f}/s")
+
+    def report(self, url: str, status: Optional[int] = None, text: Optional[str] = None,
+               timed_out: bool = False, redirected: bool = False) -> None:
+        """
+        Feed the outcome of a request back into the host's rate. text is the HTML body
+        and redirected whether the request was redirected, both used to spot challenges.
+        """
+        if timed_out:
+            self.throttled(url, "timeout")
+        elif status in (429, 503):
+            self.throttled(url, str(status))
+        elif looks_like_captcha(text, status, redirected):
+            self.throttled(url, "captcha")
+        else:
+            self.success(url)
+
+
+# Shared by every fetcher of the process, so all of them see one budget per host
+GOVERNOR = RateGovernor(host_limits={
+    # Each detail page is a full Chrome render, keep maskan-file gentle
+    "maskan-file.ir": {"rate": 0.5, "max_rate": 3},
+    "api.melkemun.com": {"rate": 2, "burst": 4, "max_rate": 10},
+})
@@ -0,0 +1,139 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from metrics import REGISTRY, ERRORS, count
+
+POLL_INTERVAL = REGISTRY.gauge("codescraper_poll_interval_seconds", "Current adaptive poll interval per source")
+
+
+class AdaptiveInterval:
+    """
+    Poll interval that tightens while polls keep finding new listings and
+    backs off exponentially while they come back empty.
+    """
+
+    def __init__(self, base: float = 20, minimum: float = 5, maximum: float = 600,
+                 shrink: float = 0.5, grow: float = 1.5, jitter: float = 0.25):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.shrink = shrink
+        self.grow = grow
+        self.jitter = jitter
+        self.current = min(max(base, minimum), maximum)
+
+    def update(self, new_items: int) -> float:
+        if new_items > 0:
+            self.current = max(self.minimum, self.current * self.shrink)
+        else:
+            self.current = min(self.maximum, self.current * self.grow)
+        return self.current
+
+    def next_delay(self) -> float:
+        # Random jitter keeps requests from falling into a recognisable rhythm
+        return self.current * random.uniform(1, 1 + self.jitter)
+
+
+class Source:
+    """A listing source: poll() ingests whatever is new and returns how many listings were added"""
+
+    def __init__(self, name: str, poll: Callable[[], int], interval: AdaptiveInterval):
+        self.name = name
+        self.poll = poll
+        self.interval = interval
+        self.polls = 0
+        self.new_items = 0
+
+
+class Scheduler:
+    """
+    Runs several sources side by side in one process, each on its own adaptive
+    interval, and triggers on_ingest (e.g. a similarity update) after polls that
+    added listings. on_ingest runs in its own thread, at most once every
+    ingest_cooldown seconds, and never overlaps itself.
+    """
+
+    def __init__(self, sources: List[Source], on_ingest: Optional[Callable[[], None]] = None,
+                 ingest_cooldown: float = 300, max_polls: Optional[int] = None, max_items: Optional[int] = None):
+        self.sources = sources
+        self.on_ingest = on_ingest
+        self.ingest_cooldown = ingest_cooldown
+        self.max_polls = max_polls
+        self.max_items = max_items
+        self._stop = threading.Event()
+        self._ingested = threading.Event()
+        self._lock = threading.Lock()
+        self.total_items = 0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        threads = [threading.Thread(target=self._run_source, args=(source,), name=f"source-{source.name}", daemon=True)
+                   for source in self.sources]
+        trigger = None
+        if self.on_ingest:
+            trigger = threading.Thread(target=self._run_trigger, name="on-ingest", daemon=True)
+            trigger.start()
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            if trigger:
+                trigger.join()
+            for source in self.sources:
+                POLL_INTERVAL.remove(source=source.name)
+
+    def _run_source(self, source: Source) -> None:
+        POLL_INTERVAL.set_function(lambda: source.interval.current, source=source.name)
+        while not self._stop.is_set():
+            try:
+                new_items = source.poll() or 0
+            except Exception as e:
+                new_items = 0
+                ERRORS.inc(stage=f"poll_{source.name}")
+                logging.error(f"Polling {source.name} failed: {e}")
+            source.polls += 1
+            source.new_items += new_items
+            count(f"new_{source.name}", new_items)
+            interval = source.interval.update(new_items)
+            logging.info(f"{source.name}: {new_items} new listings, next poll in ~{interval:.0f}s")
+
+            if new_items:
+                self._ingested.set()
+            with self._lock:
+                self.total_items += new_items
+                if self.max_items is not None and self.total_items >= self.max_items:
+                    self._stop.set()
+            if self.max_polls is not None and source.polls >= self.max_polls:
+                return
+            self._stop.wait(source.interval.next_delay())
+
+    def _run_trigger(self) -> None:
+        last_run = None
+        while True:
+            self._ingested.wait(timeout=1)
+            stopping = self._stop.is_set()
+            if not self._ingested.is_set():
+                if stopping:
+                    return
+                continue
+            remaining = 0 if last_run is None else self.ingest_cooldown - (time.monotonic() - last_run)
+            if remaining > 0 and not stopping:
+                self._stop.wait(min(remaining, 1))
+                continue
+            self._ingested.clear()
+            last_run = time.monotonic()
+            try:
+                self.on_ingest()
+            except Exception as e:
+                ERRORS.inc(stage="on_ingest")
+                logging.error(f"Post-ingest hook failed: {e}")
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import math
+import threading
+from typing import Iterable, List
+
+from database_manager import existing_file_codes, iter_file_codes
+from maskan_file import file_code_from_url
+from metrics import count
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set: "no" answers are exact, "yes" answers are wrong
+    with probability error_rate. About 1.2 MB holds a million codes at 1%.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenListingFilter:
+    """
+    Remembers which maskan-file listings are already stored, across polls and restarts.
+
+    The Bloom filter is filled from the stored file_codes on load(). Discovered
+    links whose code is definitely new pass straight through; the few possible
+    hits are confirmed against the database with one batched query, so a
+    false positive never hides a new listing.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, capacity: int = 0) -> "SeenListingFilter":
+        codes = list(iter_file_codes())
+        bloom = BloomFilter(max(self.bloom.capacity, capacity, 2 * len(codes)), self.error_rate)
+        for code in codes:
+            bloom.add(code)
+        with self._lock:
+            self.bloom = bloom
+            self.loaded = True
+        logging.info(f"Seen-listing filter loaded {len(codes)} stored file codes")
+        return self
+
+    def add(self, file_code: str) -> None:
+        """Record a listing that has just been stored"""
+        with self._lock:
+            self.bloom.add(file_code)
+            full = self.bloom.count > self.bloom.capacity
+        if full:
+            # Past capacity the error rate climbs quickly; rebuild at double size
+            self.load(capacity=2 * self.bloom.capacity)
+
+    def filter_new(self, links: Iterable[str]) -> List[str]:
+        """Return the links whose listing is not stored yet, in discovery order"""
+        if not self.loaded:
+            self.load()
+        links = list(links)
+        codes = {link: file_code_from_url(link) for link in links}
+        with self._lock:
+            maybe_seen = {code for code in codes.values() if code and code in self.bloom}
+        stored = existing_file_codes(maybe_seen) if maybe_seen else set()
+
+        new_links = [link for link in links if codes[link] is None or codes[link] not in stored]
+        count("seen_skip", len(links) - len(new_links))
+        count("seen_false_positive", len(maybe_seen - stored))
+        return new_links
@@ -1,7 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor
 from difflib import SequenceMatcher
+from address_parser import DistrictBlocks
+from geo import GeoBlocks
+from listing import Listing, listings
+from metrics import timed, count
+
+# State of a similarity worker process, set once by _init_worker so the
+# listings are pickled per process rather than per task
+_worker_checker = None
+_worker_properties = None
+_worker_changed = None
+_worker_blocks = None
+
+def _init_worker(checker, properties, changed=None):
+    global _worker_checker, _worker_properties, _worker_changed, _worker_blocks
+    _worker_checker, _worker_properties, _worker_changed = checker, properties, changed
+    _worker_blocks = checker.blocks(properties)
+
+# Score the rows i = start, start + step, ... against every later row.
+# Interleaving the rows keeps the triangular workload balanced between workers.
+def _compare_rows(start, step):
+    return _worker_checker._compare_rows(_worker_properties, range(start, len(_worker_properties), step),
+                                         _worker_blocks)
+
+# Same for the rows of the changed listings only, see compare_changed()
+def _compare_changed_rows(start, step):
+    rows = [i for i, p in enumerate(_worker_properties) if p.id in _worker_changed][start::step]
+    return _worker_checker._compare_changed_rows(_worker_properties, rows, _worker_changed, _worker_blocks)
+
+# Same value as SequenceMatcher(None, a, b).real_quick_ratio(), without building a matcher
+def length_bound(a, b) -> float:
+    total = len(a) + len(b)
+    return 2.0 * min(len(a), len(b)) / total if total else 1.0
+
+# Candidate pairs of the blocking rules that apply: a listing is compared with the
+# listings every rule allows, or with all of them when no rule restricts it
+class Blocks:
+    def __init__(self, rules):
+        self.rules = rules
+
+    def partners(self, i):
+        allowed = [partners for partners in (rule.partners(i) for rule in self.rules) if partners is not None]
+        if not allowed:
+            return None
+        if len(allowed) == 1:
+            return allowed[0]
+        common = set(allowed[0]).intersection(*allowed[1:])
+        return sorted(common)
 
 class PropertySimilarity:
-    def __init__(self):
+    # radius_km: when set, two listings that both have coordinates are only compared
+    # if they lie within radius_km of each other (see geo.GeoBlocks)
+    # same_district: two listings that both have a district are only compared when it
+    # is the same one (see address_parser.DistrictBlocks)
+    def __init__(self, radius_km=None, same_district=False):
+        self.radius_km = radius_km
+        self.same_district = same_district
         # Giving different weights to different parameters
         self.weight_config = {
             'title': 0.15,
@@ -13,61 +67,186 @@ class PropertySimilarity:
             'price': 0.2
         }
 
-    def similarity_score(self, p1: dict, p2: dict) -> float:
+    def similarity_score(self, p1, p2) -> float:
+        p1, p2 = Listing.coerce(p1), Listing.coerce(p2)
         score = 0.0
-        if p1['is_rental'] != p2['is_rental']:
-            return score
+        for _, points in self.score_terms(p1, p2):
+            score += points
+        return round(score*100, 2)
+
+    # Weighted contributions of each parameter, in the order they add up to the score.
+    # The title and address ratios can be passed in when the caller already has them.
+    def score_terms(self, p1: Listing, p2: Listing, title_ratio=None, address_ratio=None) -> list[tuple[str, float]]:
+        if p1.is_rental != p2.is_rental:
+            return []
+        # 1. Title similarity
+        if title_ratio is None:
+            title_ratio = SequenceMatcher(None, p1.title, p2.title).ratio()
+        # 2. Address similarity
+        if address_ratio is None:
+            address_ratio = SequenceMatcher(None, p1.address, p2.address).ratio()
+        return [('title', self.weight_config['title'] * title_ratio),
+                ('address', self.weight_config['address'] * address_ratio)] + self.numeric_terms(p1, p2)
+
+    # The parameters that need no string matching: cheap enough to compute before deciding
+    # whether the SequenceMatcher ratios are worth it
+    def numeric_terms(self, p1: Listing, p2: Listing) -> list[tuple[str, float]]:
+        terms = []
+        # 3. Area similarity (normalized difference)
+        area_diff = abs(int(p1.area) - int(p2.area))
+        max_area = max(int(p1.area), int(p2.area))
+        terms.append(('area', self.weight_config['area'] * max(1 - (area_diff)**2 / max_area , 0)))
+        # 4. Room count similarity (exact match)
+        terms.append(('number_of_rooms', self.weight_config['number_of_rooms'] if p1.number_of_rooms == p2.number_of_rooms else 0))
+        # 5. Year of manufacture (normalized difference)
+        if p1.year_of_manufacture and p2.year_of_manufacture:
+            year_diff = abs(int(p1.year_of_manufacture) - int(p2.year_of_manufacture))
+            terms.append(('year_of_manufacture', self.weight_config['year_of_manufacture'] * max(1 - (year_diff)**2 / 50 , 0)))
+        # 6. Facilities (Jaccard similarity)
+        facilities_union = set(p1.facilities).union(set(p2.facilities))
+        facilities_intersection = set(p1.facilities).intersection(set(p2.facilities))
+        facilities_similarity = len(facilities_intersection) / len(facilities_union) if facilities_union else 0
+        terms.append(('facilities', self.weight_config['facilities'] * facilities_similarity))
+        # 7. Price similarity (normalized difference)
+        if p1.is_rental == False:
+            if p1.total_price !=0:
+                price_diff = abs(float(p1.total_price) - float(p2.total_price))
+                max_price = max(float(p1.total_price), float(p2.total_price))
+                terms.append(('price', self.weight_config['price'] * (1 - price_diff / max_price)))
         else:
-            # 1. Title similarity
-            score += self.weight_config['title'] * SequenceMatcher(None, p1['title'], p2['title']).ratio()
-            # 2. Address similarity
-            score += self.weight_config['address'] * SequenceMatcher(None, p1['address'], p2['address']).ratio()
-            # 3. Area similarity (normalized difference)
-            area_diff = abs(int(p1['area']) - int(p2['area']))
-            max_area = max(int(p1['area']), int(p2['area']))
-            score += self.weight_config['area'] * max(1 - (area_diff)**2 / max_area , 0)
-            # 4. Room count similarity (exact match)
-            score += self.weight_config['number_of_rooms'] if p1['number_of_rooms'] == p2['number_of_rooms'] else 0
-            # 5. Year of manufacture (normalized difference)
-            if p1['year_of_manufacture'] and p2['year_of_manufacture']:
-                year_diff = abs(int(p1['year_of_manufacture']) - int(p2['year_of_manufacture']))
-                score += self.weight_config['year_of_manufacture'] * max(1 - (year_diff)**2 / 50 , 0)
-            # 6. Facilities (Jaccard similarity)
-            facilities_union = set(p1['facilities']).union(set(p2['facilities']))
-            facilities_intersection = set(p1['facilities']).intersection(set(p2['facilities']))
-            facilities_similarity = len(facilities_intersection) / len(facilities_union) if facilities_union else 0
-            score += self.weight_config['facilities'] * facilities_similarity
-            # 7. Price similarity (normalized difference)
-            if p1['is_rental'] == False:
-                if p1['total_price'] !=0:
-                    price_diff = abs(float(p1['total_price']) - float(p2['total_price']))
-                    max_price = max(float(p1['total_price']), float(p2['total_price']))
-                    score += self.weight_config['price'] * (1 - price_diff / max_price)
-            else:
-                if p1['mortgage'] != 0:
-                    mortgage_diff = abs(float(p1['mortgage']) - float(p2['mortgage']))
-                    max_motgage = max(float(p1['mortgage']), float(p2['mortgage']))
-                    score += (self.weight_config['price']/2) * (1 - mortgage_diff / (2*max_motgage))
-                if p1['rent'] != 0:
-                    rent_diff = abs(float(p1['rent']) - float(p2['rent']))
-                    max_rent = max(float(p1['rent']), float(p2['rent']))
-                    score += (self.weight_config['price']/2) * (1 - rent_diff / (max_rent))
-            return round(score*100, 2)
+            if p1.mortgage != 0:
+                mortgage_diff = abs(float(p1.mortgage) - float(p2.mortgage))
+                max_motgage = max(float(p1.mortgage), float(p2.mortgage))
+                terms.append(('price', (self.weight_config['price']/2) * (1 - mortgage_diff / (2*max_motgage))))
+            if p1.rent != 0:
+                rent_diff = abs(float(p1.rent) - float(p2.rent))
+                max_rent = max(float(p1.rent), float(p2.rent))
+                terms.append(('price', (self.weight_config['price']/2) * (1 - rent_diff / (max_rent))))
+        return terms
     
-    # Compare a list of properties two by two
-    def compare_properties(self , properties) -> list[dict]:
+    # Cascaded scoring of one pair against a threshold in score points: the cheap numeric terms
+    # first, then upper bounds of the two texts from their lengths (real_quick_ratio) and from
+    # quick_ratio, and the full ratios only when the pair can still reach the threshold.
+    # Returns (stage, terms): the stage that dropped the pair and None, or "scored" and the
+    # same terms score_terms gives, so a kept pair scores exactly like similarity_score.
+    def cascade_terms(self, p1: Listing, p2: Listing, threshold: float = 70):
+        if p1.is_rental != p2.is_rental:
+            return ('rental', None) if threshold > 0 else ('scored', [])
+        numeric = self.numeric_terms(p1, p2)
+        base = 0.0
+        for _, points in numeric:
+            base += points
+        title_weight, address_weight = self.weight_config['title'], self.weight_config['address']
+        # Half a hundredth of slack, as the final score is rounded to two decimals
+        limit = (threshold - 0.005) / 100
+        if base + title_weight + address_weight < limit:
+            return 'numeric', None
+        if base + title_weight * length_bound(p1.title, p2.title) \
+                + address_weight * length_bound(p1.address, p2.address) < limit:
+            return 'length', None
+        title = SequenceMatcher(None, p1.title, p2.title)
+        address = SequenceMatcher(None, p1.address, p2.address)
+        if base + title_weight * title.quick_ratio() + address_weight * address.quick_ratio() < limit:
+            return 'quick', None
+        title_ratio = title.ratio()
+        if base + title_weight * title_ratio + address_weight * address.quick_ratio() < limit:
+            return 'title', None
+        return 'scored', [('title', title_weight * title_ratio),
+                          ('address', address_weight * address.ratio())] + numeric
+
+    # similarity_score of the pair if it reaches threshold, else None, see cascade_terms
+    def score_above(self, p1: Listing, p2: Listing, threshold: float = 70):
+        _, terms = self.cascade_terms(p1, p2, threshold)
+        if terms is None:
+            return None
+        score = 0.0
+        for _, points in terms:
+            score += points
+        score = round(score*100, 2)
+        return score if score >= threshold else None
+
+    def blocks(self, properties):
+        rules = []
+        if self.radius_km:
+            rules.append(GeoBlocks(properties, self.radius_km))
+        if self.same_district:
+            rules.append(DistrictBlocks(properties))
+        return Blocks(rules) if rules else None
+
+    def _compare_rows(self, properties, rows, blocks=None) -> list[dict]:
+        results = []
+        for i in rows:
+            p1 = properties[i]
+            partners = blocks.partners(i) if blocks else None
+            for j in (range(i+1, len(properties)) if partners is None else partners):
+                if j <= i:
+                    continue
+                p2 = properties[j]
+                similarity = self.score_above(p1, p2, 70)
+                if similarity is not None:
+                    results.append({
+                        'property_1': p1.id,
+                        'property_2': p2.id,
+                        'similarity': similarity
+                    })
+        return results
+
+    # Score each changed row against every other row. A pair of two changed rows is scored
+    # once, from its lower index; pairs are always ordered by index like in _compare_rows
+    def _compare_changed_rows(self, properties, rows, changed, blocks=None) -> list[dict]:
         results = []
-        for i in range(len(properties)):
-            for j in range(i+1, len(properties)):
-                p1, p2 = properties[i] , properties[j]
-                similarity = self.similarity_score(p1,p2)
-                if similarity >= 70:
+        for i in rows:
+            partners = blocks.partners(i) if blocks else None
+            for j in (range(len(properties)) if partners is None else partners):
+                if j == i or (j < i and properties[j].id in changed):
+                    continue
+                p1, p2 = (properties[i], properties[j]) if i < j else (properties[j], properties[i])
+                similarity = self.score_above(p1, p2, 70)
+                if similarity is not None:
                     results.append({
-                        'property_1': p1['id'],
-                        'property_2': p2['id'],
+                        'property_1': p1.id,
+                        'property_2': p2.id,
                         'similarity': similarity
                     })
-        results.sort(key=lambda x: x['similarity'],reverse=True)
+        return results
+
+    # Rescore only the pairs involving the listings in changed (a set of ids): O(changed * n)
+    # instead of the O(n^2) full comparison
+    def compare_changed(self, properties, changed, workers=1) -> list[dict]:
+        properties = listings(properties)
+        changed = set(changed)
+        with timed("similarity"):
+            if workers > 1 and len(changed) > 1:
+                tasks = workers * 4
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(self, properties, changed)) as executor:
+                    chunks = executor.map(_compare_changed_rows, range(tasks), [tasks] * tasks)
+                    results = [result for chunk in chunks for result in chunk]
+            else:
+                rows = [i for i, p in enumerate(properties) if p.id in changed]
+                results = self._compare_changed_rows(properties, rows, changed, self.blocks(properties))
+            results.sort(key=lambda x: x['similarity'], reverse=True)
+        rows = sum(1 for p in properties if p.id in changed)
+        count("similarity_pairs", rows * (len(properties) - 1) - rows * (rows - 1) // 2)
+        count("similarity_matches", len(results))
+        return results
+
+    # Compare a list of properties two by two, optionally spread over worker processes
+    def compare_properties(self , properties, workers=1) -> list[dict]:
+        properties = listings(properties)
+        with timed("similarity"):
+            if workers > 1 and len(properties) > 1:
+                tasks = workers * 4
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(self, properties)) as executor:
+                    chunks = executor.map(_compare_rows, range(tasks), [tasks] * tasks)
+                    results = [result for chunk in chunks for result in chunk]
+            else:
+                results = self._compare_rows(properties, range(len(properties)), self.blocks(properties))
+            results.sort(key=lambda x: x['similarity'],reverse=True)
+        n = len(properties)
+        count("similarity_pairs", n * (n - 1) // 2)
+        count("similarity_matches", len(results))
         return results
 
 if __name__ == '__main__':
@@ -0,0 +1,271 @@
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from listing import Listing
+from metrics import REGISTRY, timed
+from similarity_algorithm import PropertySimilarity
+
+QUERY_CANDIDATES = REGISTRY.counter("codescraper_similar_candidates_total",
+                                    "Candidates seen by find_similar, by how far they got before being dropped")
+
+
+def _number(value, integer=False) -> float:
+    # NaN for anything similarity_score could not convert; such rows are never pruned early
+    try:
+        return float(int(value)) if integer else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _Block:
+    """
+    Numeric columns of the listings of one is_rental block in growable numpy arrays,
+    so an upper bound of every candidate's score is computed in one vectorised pass.
+    """
+
+    AREA, ROOMS, YEAR, PRICE, MORTGAGE, RENT = range(6)
+    COLUMNS = 6
+
+    def __init__(self, rental: bool, facility_bits: Dict[str, int]):
+        self.rental = rental
+        # Facility name -> bit, shared by the blocks of an index; past 63 names a set is "unknown"
+        self.facility_bits = facility_bits
+        self.ids: List[object] = []
+        self.features = np.empty((16, self.COLUMNS))
+        self.facilities = np.zeros(16, dtype=np.uint64)
+        self.alive = np.zeros(16, dtype=bool)
+        self.positions: Dict[object, int] = {}
+
+    def row(self, listing: Listing):
+        # A falsy year drops the year term entirely, which inf here stands for
+        year = _number(listing.year_of_manufacture, integer=True) if listing.year_of_manufacture else np.inf
+        return (_number(listing.area, integer=True), _number(listing.number_of_rooms), year,
+                _number(listing.total_price), _number(listing.mortgage), _number(listing.rent))
+
+    def facility_mask(self, facilities) -> int:
+        mask = 0
+        for name in set(facilities or ()):
+            bit = self.facility_bits.get(name)
+            if bit is None:
+                if len(self.facility_bits) >= 63:
+                    return 1 << 63
+                bit = self.facility_bits[name] = len(self.facility_bits)
+            mask |= 1 << bit
+        return mask
+
+    def add(self, listing: Listing) -> None:
+        position = len(self.ids)
+        if position == len(self.alive):
+            self.features = np.resize(self.features, (2 * position, self.COLUMNS))
+            self.facilities = np.concatenate([self.facilities, np.zeros(position, dtype=np.uint64)])
+            self.alive = np.concatenate([self.alive, np.zeros(position, dtype=bool)])
+        self.ids.append(listing.id)
+        self.features[position] = self.row(listing)
+        self.facilities[position] = self.facility_mask(listing.facilities)
+        self.alive[position] = True
+        self.positions[listing.id] = position
+
+    def remove(self, listing_id) -> None:
+        position = self.positions.pop(listing_id, None)
+        if position is not None:
+            self.alive[position] = False
+
+    def upper_bounds(self, query: Listing, weights: Dict[str, float]):
+        """(ids, bounds) of the live listings; a bound is never below the real score / 100"""
+        n = len(self.ids)
+        features, alive = self.features[:n], self.alive[:n]
+        q = self.row(query)
+
+        def closeness(column, value, scale=1.0):
+            # 1 - diff / (scale * max), the shape of the price terms; unknown -> 1
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = features[:, column]
+                result = 1 - np.abs(values - value) / (scale * np.maximum(values, value))
+            return np.where(np.isfinite(result), result, 1.0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            areas = features[:, self.AREA]
+            area = np.maximum(1 - (areas - q[self.AREA]) ** 2 / np.maximum(areas, q[self.AREA]), 0)
+        bounds = weights["area"] * np.where(np.isfinite(area), area, 1.0)
+        rooms = features[:, self.ROOMS]
+        bounds += weights["number_of_rooms"] * ((rooms == q[self.ROOMS]) | np.isnan(rooms) | np.isnan(q[self.ROOMS]))
+        years = features[:, self.YEAR]
+        with np.errstate(invalid="ignore"):
+            absent = np.isinf(years) | np.isinf(q[self.YEAR])
+            year = np.where(absent, 0.0, np.maximum(1 - (years - q[self.YEAR]) ** 2 / 50, 0))
+        bounds += weights["year_of_manufacture"] * np.where(np.isnan(year), 1.0, year)
+        bounds += weights["facilities"] * self._jaccard(self.facility_mask(query.facilities), n)
+        if self.rental:
+            bounds += weights["price"] / 2 * (closeness(self.MORTGAGE, q[self.MORTGAGE], 2) + closeness(self.RENT, q[self.RENT]))
+        else:
+            bounds += weights["price"] * closeness(self.PRICE, q[self.PRICE])
+        # The two texts are bounded by their full weight
+        bounds += weights["title"] + weights["address"]
+        keep = np.flatnonzero(alive)
+        return [self.ids[i] for i in keep], bounds[keep]
+
+    def _jaccard(self, query_mask: int, n: int):
+        masks = self.facilities[:n]
+        unknown = (masks >> np.uint64(63)).astype(bool) | bool(query_mask >> 63)
+        query = np.uint64(query_mask)
+        # np.bitwise_count needs numpy 2.0+ (requirements.txt pins 2.2.5)
+        union = np.bitwise_count(masks | query).astype(float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            jaccard = np.where(union > 0, np.bitwise_count(masks & query) / union, 0.0)
+        return np.where(unknown, 1.0, jaccard)
+
+
+class SimilarityIndex:
+    """
+    Long-lived in-memory index answering "which listings look like this one" without
+    rerunning the pairwise job.
+
+    Listings are blocked by is_rental (the score is 0 across blocks). Within a block a
+    vectorised upper bound from the numeric columns drops most listings at once; the
+    rest get their exact numeric terms, then upper bounds from the text lengths and
+    SequenceMatcher.quick_ratio, and only candidates that can
+    still reach min_score or beat the current k-th best get the full ratio. The bounds
+    never underestimate, so the result is exactly what similarity_score would give.
+    """
+
+    def __init__(self, listings: Iterable = (), checker: Optional[PropertySimilarity] = None):
+        self.checker = checker or PropertySimilarity()
+        self.weights = self.checker.weight_config
+        self._by_id: Dict[object, Listing] = {}
+        self._by_code: Dict[str, object] = {}
+        self._blocks: Dict[bool, _Block] = {}
+        self._facility_bits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for listing in listings:
+            self.add(listing)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, listing) -> None:
+        """Add a listing (a Listing or a dict), or replace the indexed version of one with the same id"""
+        listing = Listing.coerce(listing)
+        with self._lock:
+            self._remove(listing.id)
+            self._by_id[listing.id] = listing
+            self._by_code[listing.file_code] = listing.id
+            rental = bool(listing.is_rental)
+            self._blocks.setdefault(rental, _Block(rental, self._facility_bits)).add(listing)
+
+    def remove(self, listing_id) -> None:
+        with self._lock:
+            self._remove(listing_id)
+
+    def get(self, listing_id) -> Optional[Listing]:
+        """The indexed version of a listing, or None"""
+        with self._lock:
+            return self._by_id.get(listing_id)
+
+    def _remove(self, listing_id) -> None:
+        old = self._by_id.pop(listing_id, None)
+        if old is not None:
+            self._by_code.pop(old.file_code, None)
+            self._blocks[bool(old.is_rental)].remove(listing_id)
+
+    def resolve(self, key) -> Optional[object]:
+        """Id of the indexed listing with this id or file code, if any"""
+        if key in self._by_code:
+            return self._by_code[key]
+        if isinstance(key, str) and key.isdigit():
+            key = int(key)
+        return key if key in self._by_id else None
+
+    def _ordered(self, query: Listing, other: Listing):
+        # Stored pairs put the lower id first and similarity_score is not symmetric in the
+        # price term; a listing without an id yet is newer than every indexed one
+        if query.id is not None and query.id < other.id:
+            return query, other
+        return other, query
+
+    def _score(self, query: Listing, other: Listing, threshold: float):
+        p1, p2 = self._ordered(query, other)
+        try:
+            stage, terms = self.checker.cascade_terms(p1, p2, threshold)
+        except (TypeError, ValueError, ZeroDivisionError):
+            QUERY_CANDIDATES.inc(stage="invalid")
+            return None
+        QUERY_CANDIDATES.inc(stage=stage)
+        if terms is None:
+            return None
+        score = 0.0
+        for _, points in terms:
+            score += points
+        return round(score * 100, 2), terms
+
+    def find_similar(self, listing_or_id: Union[Listing, dict, object], k: int = 10, min_score: float = 70) -> List[dict]:
+        """
+        Top-k indexed listings scoring at least min_score against the given listing (a
+        Listing or listing dict, indexed or not, or the id of an indexed one), best first, each with
+        its per-parameter breakdown in score points.
+        """
+        if isinstance(listing_or_id, (Listing, dict)):
+            query = Listing.coerce(listing_or_id)
+        else:
+            query = self._by_id[listing_or_id]
+        heap = []  # (score, -id, terms) of the best k so far, worst on top; ties go to the lower id
+        with timed("find_similar"):
+            with self._lock:
+                block = self._blocks.get(bool(query.is_rental))
+                ids, bounds = block.upper_bounds(query, self.weights) if block else ([], np.empty(0))
+                # Most promising first, so the k-th best rises early and prunes the rest
+                order = np.argsort(-bounds, kind="stable")
+                order = order[bounds[order] * 100 >= min_score - 0.01]
+                candidates = [self._by_id[ids[i]] for i in order]
+            QUERY_CANDIDATES.inc(len(ids) - len(candidates), stage="vector")
+            for other in candidates:
+                if other.id == query.id:
+                    continue
+                threshold = max(min_score, heap[0][0]) if len(heap) >= k else min_score
+                scored = self._score(query, other, threshold)
+                if scored is None or scored[0] < min_score:
+                    continue
+                entry = (scored[0], -other.id, scored[1])
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+        results = []
+        for score, negated_id, terms in sorted(heap, key=lambda entry: entry[:2], reverse=True):
+            other_id = -negated_id
+            components = {}
+            for name, points in terms:
+                components[name] = components.get(name, 0) + points
+            results.append({
+                "id": other_id,
+                "file_code": self._by_id[other_id].file_code,
+                "similarity": score,
+                "components": {name: round(points * 100, 2) for name, points in components.items()},
+            })
+        return results
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def shared_index(load=None) -> SimilarityIndex:
+    """
+    The process-wide index, built on first use from load() (select_data by default),
+    so repeated queries and ingest hooks reuse one warm index.
+    """
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            if load is None:
+                from database_manager import select_data
+                load = select_data
+            start = time.perf_counter()
+            _shared_index = SimilarityIndex(load())
+            logging.info(f"Similarity index of {len(_shared_index)} listings built in "
+                         f"{time.perf_counter() - start:.1f}s")
+        return _shared_index
@@ -0,0 +1,226 @@
+import argparse
+import json
+import math
+import os
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from database_manager import Data, Similarity, iter_table_rows
+from listing import FIELDS as LISTING_FIELDS, Listing
+
+# Listing columns grouped by how they are stored in the snapshot
+INT_COLUMNS = ["id"]
+FLOAT_COLUMNS = ["total_price", "price_per_meter", "mortgage", "rent", "area", "number_of_rooms", "year_of_manufacture"]
+STRING_COLUMNS = ["file_code", "title", "address"]
+JSON_COLUMNS = ["facilities", "pictures"]
+# Float columns that snapshots written before they existed lack
+OPTIONAL_COLUMNS = ["latitude", "longitude", "district"]
+# String columns that snapshots written before they existed lack; "" stands for NULL
+OPTIONAL_STRING_COLUMNS = ["neighborhood", "street"]
+
+# Columns that come back as int (or None) rather than float when rows are rebuilt
+_INTEGRAL = {"area", "number_of_rooms", "year_of_manufacture", "district"}
+
+MANIFEST = "manifest.json"
+
+
+def _encode_strings(values: List[str]):
+    """Pack strings into one UTF-8 blob plus an offsets array (the string table)"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+    return blob, offsets
+
+
+class StringColumn(Sequence):
+    """A string column backed by a (memory-mapped) blob and offsets array, decoded on access"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+
+class SnapshotListings(Sequence):
+    """Row view over the listing columns; each row is rebuilt as the Listing select_data() returns"""
+
+    def __init__(self, columns: Dict[str, Any]):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        row = {"id": int(self.columns["id"][index])}
+        for name in STRING_COLUMNS:
+            row[name] = self.columns[name][index]
+        for name in FLOAT_COLUMNS:
+            value = float(self.columns[name][index])
+            if math.isnan(value):
+                row[name] = None
+            else:
+                row[name] = int(value) if name in _INTEGRAL else value
+        for name in OPTIONAL_COLUMNS:
+            if name in self.columns:
+                value = float(self.columns[name][index])
+                if math.isnan(value):
+                    row[name] = None
+                else:
+                    row[name] = int(value) if name in _INTEGRAL else value
+        for name in OPTIONAL_STRING_COLUMNS:
+            if name in self.columns:
+                row[name] = self.columns[name][index] or None
+        for name in JSON_COLUMNS:
+            row[name] = json.loads(self.columns[name][index])
+        is_rental = int(self.columns["is_rental"][index])
+        row["is_rental"] = None if is_rental < 0 else bool(is_rental)
+        # Same types as select_data(): tuples for the JSON lists, interned facility names
+        return Listing.from_row([row.get(name) for name in LISTING_FIELDS])
+
+
+class Snapshot:
+    """
+    A columnar export of the codescraper and similarity tables.
+
+    Numeric columns are plain .npy files opened with mmap_mode="r", so opening a
+    snapshot costs a handful of syscalls regardless of how many listings it holds.
+    """
+
+    def __init__(self, path: str, listing_columns: Dict[str, Any], similarity_columns: Dict[str, Any]):
+        self.path = path
+        self.columns = listing_columns
+        self.similarity_columns = similarity_columns
+        self.listings = SnapshotListings(listing_columns)
+
+    def __len__(self):
+        return len(self.listings)
+
+    def similarity_pairs(self) -> Iterator[Dict[str, Any]]:
+        """Yield similarity rows in the same shape create_sim() accepts"""
+        columns = self.similarity_columns
+        for i in range(len(columns["id"])):
+            yield {
+                "id": int(columns["id"][i]),
+                "property_1": int(columns["id_1"][i]),
+                "property_2": int(columns["id_2"][i]),
+                "similarity": float(columns["similarity"][i]),
+            }
+
+    @classmethod
+    def open(cls, path: str) -> "Snapshot":
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["format"] != "npy":
+            raise ValueError(f"Unsupported snapshot format {manifest['format']!r}, re-export it as npy")
+        return cls._open_npy(path)
+
+    @classmethod
+    def _open_npy(cls, path: str) -> "Snapshot":
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        listing_columns = {name: load(name) for name in INT_COLUMNS + FLOAT_COLUMNS + ["is_rental"]}
+        for name in OPTIONAL_COLUMNS:
+            if os.path.exists(os.path.join(path, f"{name}.npy")):
+                listing_columns[name] = load(name)
+        blob = load("strings")
+        for name in STRING_COLUMNS + JSON_COLUMNS:
+            listing_columns[name] = StringColumn(blob, load(f"{name}.offsets"))
+        for name in OPTIONAL_STRING_COLUMNS:
+            if os.path.exists(os.path.join(path, f"{name}.offsets.npy")):
+                listing_columns[name] = StringColumn(blob, load(f"{name}.offsets"))
+        similarity_columns = {name: load(f"similarity.{name}") for name in ("id", "id_1", "id_2", "similarity")}
+        return cls(path, listing_columns, similarity_columns)
+
+
+def _collect_listings(batch_size: int) -> Dict[str, list]:
+    columns = {name: [] for name in INT_COLUMNS + FLOAT_COLUMNS + OPTIONAL_COLUMNS + STRING_COLUMNS
+               + OPTIONAL_STRING_COLUMNS + JSON_COLUMNS + ["is_rental"]}
+    for row in iter_table_rows(Data, batch_size=batch_size):
+        columns["id"].append(row["id"])
+        for name in FLOAT_COLUMNS + OPTIONAL_COLUMNS:
+            columns[name].append(math.nan if row[name] is None else row[name])
+        for name in STRING_COLUMNS + OPTIONAL_STRING_COLUMNS:
+            columns[name].append(row[name] or "")
+        for name in JSON_COLUMNS:
+            columns[name].append(json.dumps(row[name] or [], ensure_ascii=False))
+        columns["is_rental"].append(-1 if row["is_rental"] is None else int(row["is_rental"]))
+    return columns
+
+
+def _collect_similarity(batch_size: int) -> Dict[str, list]:
+    columns = {"id": [], "id_1": [], "id_2": [], "similarity": []}
+    for row in iter_table_rows(Similarity, batch_size=batch_size):
+        columns["id"].append(row["id"])
+        columns["id_1"].append(-1 if row["id_1"] is None else row["id_1"])
+        columns["id_2"].append(-1 if row["id_2"] is None else row["id_2"])
+        columns["similarity"].append(math.nan if row["similarity"] is None else row["similarity"])
+    return columns
+
+
+def _write_npy(path: str, listings: Dict[str, list], similarity: Dict[str, list]) -> None:
+    for name in INT_COLUMNS:
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(listings[name], dtype=np.int64))
+    for name in FLOAT_COLUMNS + OPTIONAL_COLUMNS:
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(listings[name], dtype=np.float64))
+    np.save(os.path.join(path, "is_rental.npy"), np.asarray(listings["is_rental"], dtype=np.int8))
+
+    # All text columns share one blob; each keeps its own offsets into it
+    blobs, base = [], 0
+    for name in STRING_COLUMNS + OPTIONAL_STRING_COLUMNS + JSON_COLUMNS:
+        blob, offsets = _encode_strings(listings[name])
+        np.save(os.path.join(path, f"{name}.offsets.npy"), offsets + base)
+        blobs.append(blob)
+        base += len(blob)
+    np.save(os.path.join(path, "strings.npy"), np.concatenate(blobs))
+
+    for name, dtype in (("id", np.int64), ("id_1", np.int64), ("id_2", np.int64), ("similarity", np.float64)):
+        np.save(os.path.join(path, f"similarity.{name}.npy"), np.asarray(similarity[name], dtype=dtype))
+
+
+def export_snapshot(path: str, fmt: str = "npy", batch_size: int = 5000) -> Dict[str, int]:
+    """
+    Export listings and similarity pairs from the database into a snapshot directory.
+
+    :param fmt: "npy", one memory-mappable .npy per column plus a string table (the only format)
+    :return: number of listings and similarity pairs written
+    """
+    if fmt != "npy":
+        raise ValueError(f"Unknown snapshot format: {fmt}")
+    os.makedirs(path, exist_ok=True)
+    listings = _collect_listings(batch_size)
+    similarity = _collect_similarity(batch_size)
+    _write_npy(path, listings, similarity)
+
+    counts = {"listings": len(listings["id"]), "similarity": len(similarity["id"])}
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"format": fmt, **counts}, f)
+    return counts
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """Open a snapshot directory written by export_snapshot()"""
+    return Snapshot.open(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the database into a columnar snapshot")
+    parser.add_argument("path", help="snapshot directory")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    print(export_snapshot(args.path, batch_size=args.batch_size))
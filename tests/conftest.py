@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# database_manager binds its engine on import, so the tests point it at a throwaway SQLite file first
+os.environ["CODESCRAPER_DB_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="codescraper-"), "test.db")
+
+DUMP = os.path.join(ROOT, "Dump20250517", "codescraper_codescraper.sql")
+
+
+@pytest.fixture
+def db():
+    """database_manager with every table emptied"""
+    import database_manager
+
+    with database_manager.engine.begin() as connection:
+        for table in reversed(database_manager.Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    return database_manager
+
+
+@pytest.fixture
+def dump_listings(db):
+    """The listings of the bundled mysqldump, as select_data() returns them"""
+    from dump_manager import import_dump
+
+    import_dump(DUMP)
+    return db.select_data()
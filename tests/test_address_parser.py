@@ -0,0 +1,47 @@
+import pytest
+
+from address_parser import normalize, parse_address
+
+# Arabic spellings and Arabic-Indic digits, as other sites (and some keyboards) write them
+ARABIC = str.maketrans({"ی": "ي", "ک": "ك", **{str(d): chr(0x0660 + d) for d in range(10)}})
+
+
+def _address(listings, file_code):
+    return next(listing.address for listing in listings if listing.file_code == file_code)
+
+
+def test_every_dump_address_has_a_district(dump_listings):
+    for listing in dump_listings:
+        parsed = parse_address(listing.address)
+        assert parsed["district"] is not None, listing.address
+        assert parsed["neighborhood"], listing.address
+
+
+@pytest.mark.parametrize("file_code, expected", [
+    # Persian digits in the street, bracketed alias of the neighbourhood
+    ("2883085", {"district": 2, "neighborhood": "توس",
+                 "street": "بلوار توس(جراح ، خادم الشریعه درودی حجت) 50 متر رهن و اجاره در"}),
+    # Zero-width non-joiner inside a name
+    ("2874767", {"district": 10, "neighborhood": "قاسم آباد", "street": "اندیشه قاسم آباد (شهرک غرب) -( 75متر فول )-"}),
+    # A digit in the neighbourhood name is not a street or district
+    ("2876696", {"district": 7, "neighborhood": "17 شهریور",
+                 "street": "فدائیان اسلام مقدم فروش آپارتمان 72 متری 2 خوابه در"}),
+    # "4 و 5" is one merged district, filed under its first number
+    ("2887329", {"district": 4, "neighborhood": "طلاب", "street": "مفتح رهن اجاره آپارتمان 80متری"}),
+])
+def test_dump_addresses(dump_listings, file_code, expected):
+    assert parse_address(_address(dump_listings, file_code)) == expected
+
+
+@pytest.mark.parametrize("file_code", ["2887338", "2748804", "2866820", "2887337"])
+def test_arabic_yeh_kaf_and_digits_parse_like_the_persian_spelling(dump_listings, file_code):
+    address = _address(dump_listings, file_code)
+    arabic = address.translate(ARABIC)
+    assert arabic != address
+    assert parse_address(arabic) == parse_address(address)
+    assert normalize(arabic) == normalize(address)
+
+
+def test_missing_parts_are_none():
+    assert parse_address(None) == {"district": None, "neighborhood": None, "street": None}
+    assert parse_address("بلوار وکیل آباد ۱۲") == {"district": None, "neighborhood": None, "street": "وکیل آباد 12"}
@@ -0,0 +1,19 @@
+from checkpoint import Checkpoint
+
+
+def test_unfetchable_leftovers_are_dropped_and_the_frontier_rediscovered(db):
+    discoveries = [["a", "b", "c"], ["d"]]
+    checkpoint = Checkpoint("test", max_attempts=2)
+    assert checkpoint.frontier(lambda: discoveries.pop(0)) == ["a", "b", "c"]
+    checkpoint.done(["a"])
+    checkpoint.dropped(["c"])
+
+    # "b" keeps failing: pending for the first resume, dropped after the second failure
+    checkpoint.failed(["b"])
+    checkpoint = Checkpoint("test", max_attempts=2)
+    assert checkpoint.frontier(lambda: discoveries.pop(0)) == ["b"]
+    checkpoint.failed(["b"])
+
+    checkpoint = Checkpoint("test", max_attempts=2)
+    assert checkpoint.frontier(lambda: discoveries.pop(0)) == ["d"]
+    assert checkpoint.get("failures") is None
@@ -0,0 +1,37 @@
+from sqlalchemy.exc import OperationalError
+
+from listing import Listing
+from metrics import ITEMS
+
+
+def _listing(code, price=9e9):
+    return Listing(file_code=code, title="آپارتمان 120 متری", address="منطقه 9 محله هنرستان", total_price=price,
+                   area=120, number_of_rooms=2, is_rental=False)
+
+
+def _counts(*events):
+    return {event: ITEMS.value(event=event) for event in events}
+
+
+def test_skip_counters(db):
+    events = ("inserted", "updated", "unchanged_skip", "duplicate_skip")
+    before = _counts(*events)
+    db.bulk_create_data([_listing("1"), _listing("2")])
+    # "1" again unchanged, "2" with a new price, "3" new and then repeated within the batch
+    db.bulk_create_data([_listing("1"), _listing("2", price=8e9), _listing("3"), _listing("3")])
+    after = _counts(*events)
+
+    assert {event: after[event] - before[event] for event in events} == {
+        "inserted": 3, "updated": 1, "unchanged_skip": 1, "duplicate_skip": 3}
+
+
+def test_create_data_reports_inserts_and_updates(db, monkeypatch):
+    assert db.create_data(_listing("1")) is True
+    assert db.create_data(_listing("1")) is False
+    assert db.create_data(_listing("1", price=8e9)) is True
+
+    def fail(*args, **kwargs):
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+
+    monkeypatch.setattr(db, "_update_changed", fail)
+    assert db.create_data(_listing("1", price=7e9)) is False
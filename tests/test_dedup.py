@@ -0,0 +1,53 @@
+import pytest
+
+import dedup
+from dedup import IngestDeduplicator
+from listing import Listing
+from similarity_index import SimilarityIndex
+
+
+def _listing(code, title="آپارتمان 120 متری نوساز"):
+    return Listing(file_code=code, title=title, address="منطقه 9 محله هنرستان خیابان هاشمیه", total_price=9e9,
+                   area=120, number_of_rooms=2, year_of_manufacture=3, facilities=["پارکینگ"], is_rental=False)
+
+
+@pytest.fixture
+def deduplicator():
+    return IngestDeduplicator(index=SimilarityIndex())
+
+
+def test_duplicates_are_clustered_and_indexed(db, deduplicator):
+    db.bulk_create_data([_listing("1"), _listing("2")], on_stored=deduplicator)
+    assert len(deduplicator.index) == 2
+    assert [cluster["size"] for cluster in db.select_clusters()] == [2]
+
+
+def test_failed_clustering_leaves_the_index_unchanged(db, deduplicator, monkeypatch):
+    db.bulk_create_data([_listing("1")], on_stored=deduplicator)
+    stored = deduplicator.index.get(1)
+
+    def fail(session, pairs):
+        raise RuntimeError("clusters unavailable")
+
+    monkeypatch.setattr(dedup, "merge_pairs", fail)
+    changed = _listing("1", title="آپارتمان 125 متری نوساز")
+    db.bulk_create_data([changed, _listing("2")], on_stored=deduplicator)
+
+    # The listings are stored (the hook runs in a savepoint) but the index only has what it had
+    assert len(db.select_data()) == 2
+    assert len(deduplicator.index) == 1
+    assert deduplicator.index.get(1) is stored
+
+
+def test_rolled_back_insert_leaves_the_index_unchanged(db, deduplicator):
+    listing = _listing("1")
+    listing.id = 1
+    with pytest.raises(RuntimeError):
+        with db.session_scope() as session:
+            session.add(db.Data(id=1, file_code="1", title=listing.title, address=listing.address))
+            session.flush()
+            deduplicator(session, [listing])
+            assert len(deduplicator.index) == 1
+            raise RuntimeError("insert failed after the hook")
+    assert len(deduplicator.index) == 0
+    assert db.select_data() == []
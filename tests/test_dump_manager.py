@@ -0,0 +1,41 @@
+from sqlalchemy.exc import OperationalError
+
+import dump_manager
+from conftest import DUMP
+from dump_manager import export_dump, import_dump
+
+
+def test_export_round_trips_rows_and_indexes(dump_listings, db, tmp_path):
+    path = tmp_path / "dump.sql"
+    counts = export_dump(str(path))
+    assert counts["codescraper"] == len(dump_listings)
+
+    text = path.read_text(encoding="utf-8")
+    for index in db.Data.__table__.indexes:
+        assert f"CREATE INDEX `{index.name}` ON `codescraper`" in text
+    assert "CREATE INDEX `ix_codescraper_file_code` ON `codescraper` (`file_code`);" in text
+
+    with db.engine.begin() as connection:
+        connection.execute(db.Data.__table__.delete())
+    stats = import_dump(str(path))
+    assert stats["codescraper"]["inserted"] == len(dump_listings)
+    assert db.select_data() == dump_listings
+
+
+def test_failed_batch_is_counted_and_the_import_goes_on(db, monkeypatch):
+    loader, convert = dump_manager._LOADERS["codescraper"]
+    calls = []
+
+    def fail_first(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise OperationalError("INSERT", {}, Exception("lock wait timeout"))
+        return loader(rows)
+
+    monkeypatch.setitem(dump_manager._LOADERS, "codescraper", (fail_first, convert))
+    stats = import_dump(DUMP, batch_size=50)["codescraper"]
+
+    assert stats["rows"] == 205
+    assert stats["failed"] == 50
+    assert stats["inserted"] == 155
+    assert len(db.select_data()) == 155
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from geo import GeoBlocks, covering_cells, geohash, haversine_km, precision_for
+
+
+def _points(rng, lat, lon, spread, n=400):
+    return [(lat + rng.uniform(-spread, spread), lon + rng.uniform(-spread, spread)) for _ in range(n)]
+
+
+@pytest.mark.parametrize("lat, lon, radius_km", [(35.7, 51.4, 0.5), (35.7, 51.4, 2.0), (35.7, 51.4, 15.0),
+                                                 (64.1, -21.9, 1.0), (0.0, 179.99, 3.0)])
+def test_covering_cells_contain_every_point_within_the_radius(lat, lon, radius_km):
+    rng = random.Random(radius_km)
+    spread = radius_km / 50
+    for center in _points(rng, lat, lon, spread, 20):
+        precision = precision_for(radius_km, center[0])
+        cells = covering_cells(*center, radius_km)
+        for point in _points(rng, *center, spread):
+            point = (point[0], (point[1] + 180.0) % 360.0 - 180.0)
+            if haversine_km(*center, *point) <= radius_km:
+                assert geohash(*point, precision) in cells
+
+
+@pytest.mark.parametrize("radius_km", [0.3, 2.0, 10.0])
+def test_near_matches_brute_force(radius_km):
+    rng = random.Random(radius_km)
+    points = _points(rng, 35.7, 51.4, radius_km / 40)
+    properties = [{"latitude": lat, "longitude": lon} for lat, lon in points]
+    # Listings without coordinates (or with an unset 0, 0 pin) are not placed but stay partners of everything
+    properties += [{"latitude": None, "longitude": None}, {"latitude": 0, "longitude": 0}]
+    blocks = GeoBlocks(properties, radius_km)
+
+    for i, (lat, lon) in enumerate(points):
+        expected = [j for j, point in enumerate(points) if haversine_km(lat, lon, *point) <= radius_km]
+        assert blocks.near(lat, lon) == expected
+        assert blocks.partners(i) == sorted(expected + [len(points), len(points) + 1])
+    assert blocks.partners(len(points)) is None
@@ -0,0 +1,61 @@
+import functools
+import http.server
+import os
+import threading
+
+import numpy as np
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_hash import ImageCache, PhotoIndex, build_index, directory_photos
+
+
+def _pattern(seed, size=256):
+    """A blocky grayscale picture with structure on the scale the hashes look at"""
+    blocks = np.random.default_rng(seed).integers(0, 256, (12, 12), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((size, size), Image.BILINEAR).convert("RGB")
+
+
+@pytest.fixture
+def photos(tmp_path):
+    original = _pattern(1)
+    original.save(tmp_path / "a.png")
+    # The same photo re-uploaded: scaled down, recompressed and slightly brighter
+    repost = original.resize((180, 180)).point(lambda v: min(255, v + 6))
+    repost.save(tmp_path / "a_repost.jpg", quality=70)
+    _pattern(2).save(tmp_path / "b.png")
+    _pattern(3).save(tmp_path / "c.jpg", quality=90)
+    return tmp_path
+
+
+def _pairs(index):
+    return {frozenset((first, second)) for first, second, _ in index.shared_photo_pairs()}
+
+
+def test_directory_pairs_only_near_identical_photos(photos, tmp_path):
+    index = build_index(directory_photos(str(photos)), cache=ImageCache(str(tmp_path / "cache")), workers=2,
+                        index=PhotoIndex())
+    assert set(index.hashes) == {"a.png", "a_repost.jpg", "b.png", "c.jpg"}
+    assert _pairs(index) == {frozenset(("a.png", "a_repost.jpg"))}
+
+
+def test_http_photos_go_through_the_cache(photos, tmp_path):
+    requests = pytest.importorskip("requests")
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(photos))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        listing_photos = [(1, f"{base}/a.png?v=1"), (2, f"{base}/a_repost.jpg"), (3, f"{base}/b.png"),
+                          (4, f"{base}/missing.png")]
+        cache = ImageCache(str(tmp_path / "cache"), session=requests.Session())
+        index = build_index(listing_photos, cache=cache, workers=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The missing photo is skipped; the others are cached without the query string
+    assert set(index.hashes) == {1, 2, 3}
+    assert os.path.exists(cache.path(f"{base}/a.png"))
+    assert _pairs(index) == {frozenset((1, 2))}
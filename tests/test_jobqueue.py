@@ -0,0 +1,90 @@
+import threading
+from collections import Counter
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from jobqueue import Worker
+from listing import Listing
+
+JOBS = 60
+
+
+def _handler(seen):
+    def handle(payload):
+        seen.append(payload)
+        return [Listing(file_code=payload, title=f"listing {payload}", address="منطقه 1")]
+    return handle
+
+
+def _stored(db):
+    with db.session_scope() as session:
+        return session.execute(select(func.count()).select_from(db.Data)).scalar()
+
+
+def test_workers_process_every_job_once(db):
+    payloads = [str(i) for i in range(JOBS)]
+    assert db.enqueue_jobs("test", payloads) == JOBS
+
+    seen = []
+    workers = [Worker({"test": _handler(seen)}, claim_size=4, idle_sleep=0, worker_id=f"w{i}") for i in range(3)]
+    threads = [threading.Thread(target=worker.run, kwargs={"exit_when_idle": True}) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert Counter(seen) == Counter(payloads)
+    assert sum(worker.jobs_done for worker in workers) == JOBS
+    assert db.job_counts() == {("test", "done"): JOBS}
+    assert _stored(db) == JOBS
+
+
+def test_failed_insert_leaves_jobs_pending(db, monkeypatch):
+    payloads = [str(i) for i in range(10)]
+    db.enqueue_jobs("test", payloads)
+    bulk_create_data, written = db.bulk_create_data, []
+
+    def fail(*args, **kwargs):
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+
+    def record(list_data, **kwargs):
+        written.extend(listing["file_code"] for listing in list_data)
+        return bulk_create_data(list_data, **kwargs)
+
+    monkeypatch.setattr(db, "bulk_create_data", fail)
+    worker = Worker({"test": _handler([])}, claim_size=len(payloads), retry_delay=0, idle_sleep=0)
+    worker.run(max_jobs=len(payloads))
+
+    assert worker.jobs_done == 0
+    assert worker.writer.pending == 0
+    assert db.job_counts() == {("test", "queued"): len(payloads)}
+    with db.session_scope() as session:
+        assert set(session.execute(select(db.ScrapeJob.attempts)).scalars()) == {0}
+
+    # Once the database is back, the same worker picks the released jobs up and writes each listing once
+    monkeypatch.setattr(db, "bulk_create_data", record)
+    assert worker.run(exit_when_idle=True) == len(payloads)
+    assert db.job_counts() == {("test", "done"): len(payloads)}
+    assert sorted(written) == sorted(payloads)
+    assert _stored(db) == len(payloads)
+
+
+def test_listings_of_a_failed_handler_are_not_stored(db):
+    db.enqueue_jobs("test", ["1", "2"])
+    attempts = Counter()
+
+    def handle(payload):
+        attempts[payload] += 1
+        yield Listing(file_code=payload, title=f"listing {payload}", address="منطقه 1")
+        if payload == "2" and attempts[payload] == 1:
+            raise ValueError("page changed halfway")
+        yield Listing(file_code=payload + "b", title=f"listing {payload}b", address="منطقه 1")
+
+    worker = Worker({"test": handle}, claim_size=2, retry_delay=0, idle_sleep=0)
+    worker.run(max_jobs=2)
+    assert db.job_counts() == {("test", "done"): 1, ("test", "queued"): 1}
+    assert sorted(listing["file_code"] for listing in db.select_data()) == ["1", "1b"]
+
+    worker.run(exit_when_idle=True)
+    assert sorted(listing["file_code"] for listing in db.select_data()) == ["1", "1b", "2", "2b"]
@@ -0,0 +1,58 @@
+import requests
+
+from maskan_http import MORE_TEXT, discover_links
+
+URL = "https://maskan-file.ir/Site/Default.aspx"
+
+
+def _page(codes, more=True):
+    cards = "".join(f"<div class=\"btn-showdetail\" onclick=\"window.open('/Site/View.aspx?id={code}')\"></div>"
+                    for code in codes)
+    link = f"<a href=\"javascript:__doPostBack('ctl00$more','')\">{MORE_TEXT}</a>" if more else ""
+    return f"<form><input type=\"hidden\" name=\"__VIEWSTATE\" value=\"x\" />{cards}{link}</form>"
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+class _Session:
+    # Page 1 on GET, page 2 (cumulative, like the site) on the first postback, then a failure
+    def __init__(self):
+        self.posts = 0
+
+    def get(self, url, **kwargs):
+        return _Response(_page([1, 2]))
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        if self.posts > 1:
+            raise requests.ConnectionError("reset by peer")
+        return _Response(_page([1, 2, 3, 4]))
+
+
+class _Detector:
+    def __init__(self, start_page):
+        self.start_page = start_page
+
+    def run(self):
+        # Relative links like the browser sees them; page 2 is replayed but 5 and 6 are new
+        return [f"/Site/View.aspx?id={code}" for code in (3, 4, 5, 6)]
+
+
+def test_failed_page_keeps_earlier_links_and_resumes_the_fallback():
+    detectors = []
+
+    def fallback(start_page):
+        detectors.append(_Detector(start_page))
+        return detectors[-1]
+
+    links = discover_links(URL, fallback, max_pages=None, session=_Session())
+
+    assert [detector.start_page for detector in detectors] == [3]
+    assert links[:4] == [f"https://maskan-file.ir/Site/View.aspx?id={code}" for code in (1, 2, 3, 4)]
+    assert links[4:] == ["/Site/View.aspx?id=5", "/Site/View.aspx?id=6"]
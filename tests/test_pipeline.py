@@ -0,0 +1,64 @@
+import threading
+import time
+
+from pipeline import Pipeline, Stage
+
+
+def _threads():
+    return {thread.name for thread in threading.enumerate() if thread.name.startswith("pipeline-")}
+
+
+def test_queues_bound_how_far_the_source_runs_ahead():
+    release, yielded = threading.Event(), []
+
+    def source():
+        for i in range(100):
+            yielded.append(i)
+            yield i
+
+    def slow(item):
+        release.wait(5)
+        return item
+
+    pipeline = Pipeline(source(), [Stage("slow", slow, workers=1, queue_size=3)])
+    runner = threading.Thread(target=pipeline.run)
+    runner.start()
+    time.sleep(0.3)
+    # One item in the worker, three queued and one blocked in put()
+    assert len(yielded) <= 5
+    release.set()
+    runner.join(5)
+    assert not runner.is_alive()
+    assert pipeline.produced == 100
+
+
+def test_dropped_and_failed_items_are_counted():
+    def keep_even(item):
+        if item == 7:
+            raise ValueError("broken item")
+        return item if item % 2 == 0 else None
+
+    persisted = []
+    stages = [Stage("clean", keep_even, workers=3, queue_size=2),
+              Stage("persist", lambda item: persisted.append(item) or item, workers=2, queue_size=2)]
+    stats = Pipeline(range(20), stages).run()
+
+    assert stats["clean"]["processed"] == 10
+    assert stats["clean"]["dropped"] == 10
+    assert stats["clean"]["errors"] == 1
+    assert stats["persist"]["processed"] == 10
+    assert sorted(persisted) == list(range(0, 20, 2))
+
+
+def test_every_thread_stops_even_when_the_source_fails():
+    def source():
+        yield from range(5)
+        raise RuntimeError("discovery failed")
+
+    pipeline = Pipeline(source(), [Stage("a", lambda item: item, workers=4, queue_size=1),
+                                   Stage("b", lambda item: item, workers=2, queue_size=1)])
+    stats = pipeline.run()
+
+    assert pipeline.produced == 5
+    assert stats["b"]["processed"] == 5
+    assert not _threads()
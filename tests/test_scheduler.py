@@ -0,0 +1,50 @@
+import threading
+import time
+
+from scheduler import AdaptiveInterval, Scheduler, Source
+
+
+def _interval():
+    return AdaptiveInterval(base=0.01, minimum=0.01, maximum=0.02, jitter=0)
+
+
+def test_trigger_runs_alongside_ingest():
+    ingesting, polled_meanwhile = threading.Event(), threading.Event()
+    polls = []
+
+    def poll():
+        polls.append(time.monotonic())
+        if ingesting.is_set():
+            polled_meanwhile.set()
+        return 1
+
+    def on_ingest():
+        ingesting.set()
+        # Only returns once a source polled while the hook was running
+        assert polled_meanwhile.wait(5)
+
+    scheduler = Scheduler([Source("a", poll, _interval()), Source("b", poll, _interval())], on_ingest=on_ingest,
+                          ingest_cooldown=0, max_polls=50)
+    scheduler.run()
+
+    assert polled_meanwhile.is_set()
+    assert scheduler.total_items == len(polls) == 100
+
+
+def test_trigger_respects_the_cooldown_and_stops_with_the_sources():
+    calls = []
+    scheduler = Scheduler([Source("a", lambda: 1, _interval())], on_ingest=lambda: calls.append(time.monotonic()),
+                          ingest_cooldown=60, max_polls=20)
+    start = time.monotonic()
+    scheduler.run()
+
+    # The first run, and at most one more at shutdown for what came in during the cooldown
+    assert 1 <= len(calls) <= 2
+    assert time.monotonic() - start < 5
+
+
+def test_no_trigger_without_new_listings():
+    calls = []
+    Scheduler([Source("a", lambda: 0, _interval())], on_ingest=lambda: calls.append(1), ingest_cooldown=0,
+              max_polls=5).run()
+    assert calls == []
@@ -0,0 +1,18 @@
+from similarity_algorithm import PropertySimilarity
+
+
+def test_cascade_keeps_the_baseline_pairs_and_scores(dump_listings):
+    checker = PropertySimilarity()
+    baseline = []
+    for i, p1 in enumerate(dump_listings):
+        for p2 in dump_listings[i + 1:]:
+            score = checker.similarity_score(p1, p2)
+            # Every pair the cascade drops is one the full score drops too, and no score moves
+            assert checker.score_above(p1, p2, 70) == (score if score >= 70 else None)
+            if score >= 70:
+                baseline.append((p1.id, p2.id, score))
+
+    assert len(baseline) == 13
+    found = [(pair["property_1"], pair["property_2"], pair["similarity"])
+             for pair in checker.compare_properties(dump_listings)]
+    assert sorted(found) == sorted(baseline)
@@ -0,0 +1,22 @@
+import os
+
+from snapshot import OPTIONAL_STRING_COLUMNS, export_snapshot, load_snapshot
+
+
+def test_snapshot_rows_match_select_data(dump_listings, tmp_path, db):
+    db.backfill_address_fields()
+    stored = db.select_data()
+    assert any(listing.neighborhood for listing in stored)
+
+    export_snapshot(str(tmp_path))
+    assert list(load_snapshot(str(tmp_path)).listings) == stored
+
+
+def test_snapshot_without_address_columns_still_opens(dump_listings, tmp_path):
+    export_snapshot(str(tmp_path))
+    for name in OPTIONAL_STRING_COLUMNS:
+        os.remove(tmp_path / f"{name}.offsets.npy")
+
+    listings = list(load_snapshot(str(tmp_path)).listings)
+    assert [listing.id for listing in listings] == [listing.id for listing in dump_listings]
+    assert all(listing.neighborhood is None and listing.street is None for listing in listings)